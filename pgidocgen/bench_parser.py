@@ -0,0 +1,339 @@
+# Copyright 2026 Christoph Reiter
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+
+"""Measures how fast docstrings get converted to reST.
+
+The conversion done by docstring_to_rest() is split into stages which
+are timed separately:
+
+* escape: escaping invalid XML and docbook_escape()
+* markdown: ConvertMarkDown() and inline code
+* rest: docbook to reST including reference resolving
+* plain: docstrings without markup, which skip all of the above
+
+The docstrings either come from the installed gir files or from a
+corpus file written by a previous run, see --save-corpus.
+"""
+
+import os
+import json
+import time
+
+from .util import get_gir_files
+from .namespace import set_cache_dir, get_namespace
+from .repo import Repository
+from .docbook_escape import docbook_escape
+from .parser import is_plain_docstring, _plain_docstring_to_rest, \
+    _escape_xml, _markdown_to_docbook, _docbook_to_rest, _strip_newlines
+
+
+STAGES = ["escape", "markdown", "rest", "plain"]
+
+NUM_SLOWEST = 20
+
+_CORPUS_FORMAT = 1
+_SUMMARY_FORMAT = 1
+
+
+def add_parser(subparsers):
+    parser = subparsers.add_parser(
+        "bench-parser",
+        help="Measure the speed of the docstring conversion")
+    parser.add_argument('namespace', nargs="*",
+                        help='namespace including version e.g. Gtk-3.0. '
+                             'Defaults to all installed ones.')
+    parser.add_argument('--corpus', metavar="PATH",
+                        help='read the docstrings from a corpus file '
+                             'instead of the gir files')
+    parser.add_argument('--save-corpus', metavar="PATH",
+                        help='write the docstrings to a corpus file')
+    parser.add_argument('--cache-dir', metavar="PATH",
+                        help='directory for caching parsed namespaces')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs, the fastest one is reported')
+    parser.add_argument('--json', metavar="PATH",
+                        help='write a JSON summary to PATH')
+    parser.add_argument('--compare', metavar="PATH",
+                        help='compare with the JSON summary of a '
+                             'previous run')
+    parser.set_defaults(func=main)
+
+
+def get_corpus(keys):
+    """Returns a list of (key, name, docstring) tuples for all docstrings
+    of the namespaces, e.g. ("Gtk-3.0", "Gtk.Widget", "...").
+    Namespaces which can't be loaded are skipped.
+    """
+
+    corpus = []
+    for key in keys:
+        namespace, version = key.split("-", 1)
+        try:
+            docs = get_namespace(namespace, version).docs
+        except ImportError as e:
+            print("Skipping %s: %s" % (key, e))
+            continue
+        seen = set()
+        for type_ in sorted(docs):
+            for name, entry in sorted(docs[type_].items()):
+                for docstring in (entry.docs, entry.deprecated):
+                    if docstring and docstring not in seen:
+                        seen.add(docstring)
+                        corpus.append((key, name, docstring))
+    return corpus
+
+
+def load_corpus(path):
+    """Loads a corpus written by save_corpus()"""
+
+    with open(path, "r", encoding="utf-8") as h:
+        data = json.load(h)
+    if data.get("format") != _CORPUS_FORMAT:
+        raise ValueError("unknown corpus format")
+    return [tuple(e) for e in data["docstrings"]]
+
+
+def save_corpus(path, corpus):
+    with open(path, "w", encoding="utf-8") as h:
+        json.dump({
+            "format": _CORPUS_FORMAT,
+            "docstrings": [list(e) for e in corpus],
+        }, h, indent=0, ensure_ascii=False, sort_keys=True)
+        h.write("\n")
+
+
+class _NullRepository(object):
+    """Used in place of a Repository for namespaces which aren't installed,
+    no reference can be resolved.
+    """
+
+    missed_links = 0
+
+    def lookup_py_id(self, c_id, shadowed=True):
+        return None
+
+    def lookup_py_ids(self, c_ids):
+        return dict.fromkeys(c_ids)
+
+    def lookup_py_id_for_type_struct(self, struct_c_id):
+        return None
+
+    def lookup_instance_param(self, py_id):
+        return None
+
+    def lookup_gtkdoc_ref(self, doc_ref):
+        return None
+
+    def lookup_docref(self, doc_ref):
+        return None
+
+
+def _get_repository(key):
+    if key not in get_gir_files():
+        print("GIR file for %s not found, references won't be resolved" % (
+            key,))
+        return _NullRepository()
+
+    try:
+        repo = Repository(*key.split("-", 1))
+        repo.import_module()
+    except ImportError as e:
+        print("Can't resolve references for %s: %s" % (key, e))
+        repo = _NullRepository()
+    return repo
+
+
+def _convert(repo, docstring):
+    """Converts the docstring like docstring_to_rest(), without context.
+
+    Returns the reST and a dict mapping the stages the docstring went
+    through to their durations. Checking for plain docstrings is counted
+    towards the first stage.
+    """
+
+    clock = time.perf_counter
+    t0 = clock()
+    if is_plain_docstring(docstring):
+        rst = _plain_docstring_to_rest(repo, docstring, None, None)
+        return rst, {"plain": clock() - t0}
+
+    docstring = _escape_xml(docstring)
+    docbook = docbook_escape(docstring)
+    t1 = clock()
+    docbook = _markdown_to_docbook(docbook)
+    t2 = clock()
+    rst = _docbook_to_rest(repo, docbook, None, None)
+    rst = _strip_newlines(docstring, rst)
+    t3 = clock()
+    return rst, {"escape": t1 - t0, "markdown": t2 - t1, "rest": t3 - t2}
+
+
+def benchmark(corpus, repeat=1, get_repository=_get_repository):
+    """Converts all docstrings of the corpus `repeat` times and returns a
+    summary which can be serialized to JSON.
+
+    For every docstring and stage the fastest run is used.
+    """
+
+    repos = {}
+    for key, name, docstring in corpus:
+        if key not in repos:
+            repos[key] = get_repository(key)
+
+    timings = [None] * len(corpus)
+    for run in range(max(repeat, 1)):
+        for index, (key, name, docstring) in enumerate(corpus):
+            durations = _convert(repos[key], docstring)[1]
+            best = timings[index]
+            if best is None:
+                timings[index] = durations
+            else:
+                for stage, duration in durations.items():
+                    if duration < best[stage]:
+                        best[stage] = duration
+
+    stages = dict((stage, {"docstrings": 0, "bytes": 0, "time": 0.0})
+                  for stage in STAGES)
+    total = {"docstrings": len(corpus), "bytes": 0, "time": 0.0}
+    entries = []
+    for (key, name, docstring), durations in zip(corpus, timings):
+        size = len(docstring.encode("utf-8"))
+        duration = sum(durations.values())
+        total["bytes"] += size
+        total["time"] += duration
+        for stage, stage_duration in durations.items():
+            stats = stages[stage]
+            stats["docstrings"] += 1
+            stats["bytes"] += size
+            stats["time"] += stage_duration
+        entries.append((duration, key, name, size, durations))
+
+    for stats in list(stages.values()) + [total]:
+        stats["mb_per_s"] = (
+            stats["bytes"] / 1024 ** 2 / stats["time"] if stats["time"]
+            else 0.0)
+
+    entries.sort(key=lambda e: e[0], reverse=True)
+    slowest = []
+    for duration, key, name, size, durations in entries[:NUM_SLOWEST]:
+        slowest.append({
+            "namespace": key,
+            "name": name,
+            "bytes": size,
+            "time": duration,
+            "stages": durations,
+        })
+
+    return {
+        "format": _SUMMARY_FORMAT,
+        "namespaces": sorted(repos),
+        "repeat": repeat,
+        "stages": stages,
+        "total": total,
+        "slowest": slowest,
+    }
+
+
+def format_summary(summary):
+    lines = []
+    total = summary["total"]
+    lines.append("%d docstrings, %.2f MB, %d namespace(s)" % (
+        total["docstrings"], total["bytes"] / 1024 ** 2,
+        len(summary["namespaces"])))
+    lines.append("")
+    lines.append("%-10s %10s %10s %10s" % (
+        "stage", "docstrings", "time", "MB/s"))
+    for stage in STAGES + ["total"]:
+        if stage == "total":
+            stats = summary["total"]
+        else:
+            stats = summary["stages"][stage]
+        lines.append("%-10s %10d %9.3fs %10.2f" % (
+            stage, stats["docstrings"], stats["time"], stats["mb_per_s"]))
+    lines.append("")
+    lines.append("Slowest docstrings:")
+    for entry in summary["slowest"]:
+        lines.append("%8.2f ms %8d bytes  %s %s (%s)" % (
+            entry["time"] * 1000, entry["bytes"], entry["namespace"],
+            entry["name"], ", ".join(
+                "%s %.2f ms" % (s, entry["stages"][s] * 1000)
+                for s in STAGES if s in entry["stages"])))
+    return "\n".join(lines)
+
+
+def format_comparison(old, new):
+    """Compares the throughput of two summaries"""
+
+    lines = []
+    if (old["namespaces"] != new["namespaces"] or
+            old["total"]["docstrings"] != new["total"]["docstrings"]):
+        lines.append("Warning: the summaries are for different corpora")
+    lines.append("%-10s %10s %10s %8s" % (
+        "stage", "old MB/s", "new MB/s", "change"))
+    for stage in STAGES + ["total"]:
+        if stage == "total":
+            a, b = old["total"], new["total"]
+        elif stage in old["stages"] and stage in new["stages"]:
+            a, b = old["stages"][stage], new["stages"][stage]
+        else:
+            continue
+        if a["mb_per_s"]:
+            change = "%+7.1f%%" % (
+                (b["mb_per_s"] / a["mb_per_s"] - 1) * 100)
+        else:
+            change = "-"
+        lines.append("%-10s %10.2f %10.2f %8s" % (
+            stage, a["mb_per_s"], b["mb_per_s"], change))
+    return "\n".join(lines)
+
+
+def main(args):
+    if args.cache_dir:
+        set_cache_dir(args.cache_dir)
+
+    if args.corpus:
+        if args.namespace:
+            print("Namespaces can't be combined with --corpus")
+            raise SystemExit(1)
+        try:
+            corpus = load_corpus(args.corpus)
+        except (OSError, ValueError, KeyError) as e:
+            print("Can't load corpus %r: %s" % (args.corpus, e))
+            raise SystemExit(1)
+    else:
+        girs = get_gir_files()
+        for key in args.namespace:
+            if key not in girs:
+                print("GIR file for %s not found, aborting." % key)
+                raise SystemExit(1)
+        corpus = get_corpus(args.namespace or sorted(girs))
+
+    if args.save_corpus:
+        save_corpus(args.save_corpus, corpus)
+        print("Saved %d docstrings to %r" % (len(corpus), args.save_corpus))
+
+    if not corpus:
+        print("No docstrings found")
+        raise SystemExit(1)
+
+    old = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as h:
+            old = json.load(h)
+
+    summary = benchmark(corpus, args.repeat)
+    print(format_summary(summary))
+
+    if old is not None:
+        print("")
+        print("Compared to %s:" % os.path.basename(args.compare))
+        print(format_comparison(old, summary))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as h:
+            json.dump(summary, h, indent=2, sort_keys=True)
+            h.write("\n")
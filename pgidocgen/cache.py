@@ -0,0 +1,126 @@
+# Copyright 2026 Christoph Reiter
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+
+"""Helpers for the on-disk caches in '.pgidocgen.cache'.
+
+Entries are content addressed: the file name contains a hash of all the
+inputs, so a changed input results in a new entry instead of stale data.
+Entries are written to a temporary file first and then renamed into place,
+so concurrent processes only ever see complete files.
+"""
+
+import os
+import hashlib
+import tempfile
+
+
+_CODE_EXTENSIONS = (".py", ".json")
+
+
+def get_code_version(_cache=[]):
+    """Returns a hash of the pgidocgen code and data which influences
+    the cached content.
+    """
+
+    if not _cache:
+        root = os.path.dirname(os.path.abspath(__file__))
+        h = hashlib.sha256()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if not name.endswith(_CODE_EXTENSIONS):
+                    continue
+                path = os.path.join(dirpath, name)
+                h.update(os.path.relpath(path, root).encode("utf-8"))
+                with open(path, "rb") as f:
+                    h.update(f.read())
+        _cache.append(h.hexdigest())
+    return _cache[0]
+
+
+def hash_files(paths):
+    """Returns a hex digest for the content of all files and the pgidocgen
+    version. Paths which are None are skipped.
+    """
+
+    h = hashlib.sha256()
+    h.update(get_code_version().encode("ascii"))
+    for path in paths:
+        if path is None:
+            h.update(b"\x00")
+            continue
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(2 ** 20)
+                if not data:
+                    break
+                h.update(data)
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def get_entry_path(cache_dir, name, digest, ext):
+    """Returns the path of the cache entry for `name` with the content hash
+    `digest`.
+
+    e.g. ("/cache", "Gtk-3.0", "ab12..", ".pickle") ->
+        "/cache/Gtk-3.0.ab12...pickle"
+    """
+
+    return os.path.join(cache_dir, "%s.%s%s" % (name, digest, ext))
+
+
+def write_atomic(path, data):
+    """Writes `data` (bytes) to `path`, replacing any existing file in one
+    step.
+    """
+
+    dirname = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(
+        dir=dirname, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as h:
+            h.write(data)
+        # mkstemp() creates the file with 0600
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_path, 0o666 & ~umask)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def remove_stale(cache_dir, name, digest, ext):
+    """Removes all cache entries for `name` with a hash other than `digest`.
+
+    Returns the number of removed entries.
+    """
+
+    prefix = name + "."
+    removed = 0
+    try:
+        entries = os.listdir(cache_dir)
+    except OSError:
+        return removed
+
+    for entry in entries:
+        if not entry.startswith(prefix) or not entry.endswith(ext):
+            continue
+        entry_digest = entry[len(prefix):len(entry) - len(ext)]
+        if len(entry_digest) != 64 or entry_digest == digest:
+            continue
+        try:
+            os.remove(os.path.join(cache_dir, entry))
+        except OSError:
+            # some other process was faster
+            continue
+        removed += 1
+    return removed
@@ -10,8 +10,10 @@ import subprocess
 import os
 
 from .gen import ModuleGenerator
+from .build import get_cpu_count
 from .util import get_gir_files
-from .namespace import set_cache_prefix_path
+from .namespace import set_cache_dir
+from . import docstring_cache
 
 
 def add_parser(subparsers):
@@ -21,13 +23,17 @@ def add_parser(subparsers):
                         help='path to where the resulting source should be')
     parser.add_argument('namespace', nargs="+",
                         help='namespace including version e.g. Gtk-3.0')
+    parser.add_argument('-j', '--jobs', type=int, default=get_cpu_count(),
+                        help='number of processes used for converting '
+                             'docstrings')
     parser.set_defaults(func=main)
 
 
-def _main_many(target, namespaces):
+def _main_many(target, namespaces, jobs):
     for namespace in namespaces:
         subprocess.check_call(
-            [sys.executable, sys.argv[0], "create", target, namespace])
+            [sys.executable, sys.argv[0], "create", "-j", str(jobs),
+             target, namespace])
 
 
 def main(args):
@@ -35,7 +41,7 @@ def main(args):
         print("No namespace given")
         raise SystemExit(1)
     elif len(args.namespace) > 1:
-        return _main_many(args.target, args.namespace)
+        return _main_many(args.target, args.namespace, args.jobs)
     else:
         namespace = args.namespace[0]
 
@@ -45,9 +51,10 @@ def main(args):
         print("GIR file for %s not found, aborting." % namespace)
         raise SystemExit(1)
 
-    cache_prefix = os.path.join(args.target, ".pgidocgen.cache", 'namespace')
-    set_cache_prefix_path(cache_prefix)
+    cache_dir = os.path.join(args.target, ".pgidocgen.cache")
+    set_cache_dir(os.path.join(cache_dir, "namespaces"))
+    docstring_cache.set_cache_dir(os.path.join(cache_dir, "docstrings"))
 
     namespace, version = namespace.split("-", 1)
-    gen = ModuleGenerator(namespace, version)
+    gen = ModuleGenerator(namespace, version, jobs=args.jobs)
     gen.write(args.target)
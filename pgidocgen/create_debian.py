@@ -19,6 +19,7 @@ from functools import cmp_to_key
 from .debian import get_repo_girs, get_debug_packages_for_libs, \
     get_repo_typelibs, get_missing_lib_packages
 from .util import parse_gir_shared_libs
+from .girheader import DependencyGraph
 
 
 DEB_SKIPLIST = [
@@ -207,6 +208,28 @@ def get_gir_shared_libraries(gir_dir, can_build):
     return all_libs
 
 
+def get_missing_dependencies(gir_dir, to_build):
+    """Returns a {namespace: [dependency]} dict for all namespaces in
+    `to_build` which depend on a namespace not in `to_build`.
+    """
+
+    girs = {}
+    for entry in os.listdir(gir_dir):
+        name, ext = os.path.splitext(entry)
+        if ext == ".gir":
+            girs[name] = os.path.join(gir_dir, entry)
+    graph = DependencyGraph(girs)
+
+    missing = {}
+    for name in sorted(to_build):
+        key = tuple(name.split("-", 1))
+        deps = ["%s-%s" % d for d in graph.get_all_dependencies(key)]
+        deps = sorted(d for d in deps if d not in to_build)
+        if deps:
+            missing[name] = deps
+    return missing
+
+
 def handle_missing_packages(to_install, install=False):
     if not to_install:
         return
@@ -297,6 +320,10 @@ def main(args):
     check_debug_packages(shared_libs, args.install)
 
     do_build = set(can_build) - set(SKIPLIST)
+    missing_deps = get_missing_dependencies(gir_dir, do_build)
+    for name, deps in sorted(missing_deps.items()):
+        print("Skipping %s, missing dependencies: %s" % (name, ", ".join(deps)))
+    do_build -= set(missing_deps)
     print("%d ready to build after filtering" % len(do_build))
 
     if args.no_build:
@@ -305,6 +332,10 @@ def main(args):
 
     print("starting the build..")
     os.environ["XDG_DATA_DIRS"] = data_dir
+    # parse everything on all cores first, failures will show up again below
+    subprocess.call(
+        ["xvfb-run", "-a", sys.executable, sys.argv[0],
+         "warm-cache", args.target] + sorted(do_build))
     subprocess.check_call(
         ["xvfb-run", "-a", sys.executable, sys.argv[0],
          "create", args.target] + sorted(do_build))
@@ -8,10 +8,12 @@
 
 import os
 import re
+import sys
 import types
 import inspect
 import copy
 import warnings
+import functools
 
 import gi
 from gi.repository import GObject
@@ -23,14 +25,29 @@ from .util import escape_parameter, get_signature_string
 from .parser import docstring_to_rest
 
 
-def get_hierarchy(type_seq):
+_class_hierarchies = {}
+
+
+def get_class_hierarchy(module):
+    """Returns the util.ClassHierarchy shared by all classes of a module"""
+
+    try:
+        return _class_hierarchies[module]
+    except KeyError:
+        return _class_hierarchies.setdefault(module, util.ClassHierarchy())
+
+
+def get_hierarchy(type_seq, class_hierarchy=None):
     """Returns for a sequence of classes a recursive dict including
     all their sub classes.
     """
 
+    if class_hierarchy is None:
+        class_hierarchy = util.ClassHierarchy()
+
     def first_mro(obj):
         l = [obj]
-        bases = util.fake_bases(obj)
+        bases = class_hierarchy.get_bases(obj)
         if bases[0] is not object:
             l.extend(first_mro(bases[0]))
         return l
@@ -65,8 +82,55 @@ def to_short_desc(docs):
         return docs
 
 
+class Deferred(object):
+    """A text which gets computed on first use, see Repository.defer()"""
+
+    __slots__ = ("_func", "_value")
+
+    def __init__(self, func):
+        self._func = func
+        self._value = None
+
+    def get(self):
+        if self._func is not None:
+            self._value = self._func()
+            self._func = None
+        return self._value
+
+
+def resolve(text):
+    """Returns the text of a Deferred or the text itself"""
+
+    if isinstance(text, Deferred):
+        return text.get()
+    return text
+
+
+class _DeferredText(object):
+    """An attribute which can be set to a Deferred, which gets replaced by
+    its text on first access.
+    """
+
+    def __init__(self, slot):
+        self._slot = slot
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = getattr(instance, self._slot)
+        if isinstance(value, Deferred):
+            value = value.get()
+            setattr(instance, self._slot, value)
+        return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self._slot, value)
+
+
 class BaseDocObject(object):
 
+    __slots__ = ()
+
     name = None
     fullname = None
 
@@ -77,6 +141,8 @@ class BaseDocObject(object):
 
 class SignalsMixin(object):
 
+    __slots__ = ()
+
     def _parse_signals(self, repo, obj):
         if not hasattr(obj, "signals"):
             self.signals = []
@@ -91,6 +157,8 @@ class SignalsMixin(object):
 
 class MethodsMixin(object):
 
+    __slots__ = ()
+
     def get_methods(self, static=False):
         methods = []
         for m in self.methods:
@@ -102,13 +170,10 @@ class MethodsMixin(object):
     def _parse_methods(self, repo, obj):
         methods = []
         vfuncs = []
-        for attr, attr_obj in util.iter_public_attr(obj):
+        for attr, attr_obj in util.iter_owned_public_attr(obj):
             if not callable(attr_obj):
                 continue
 
-            if not util.is_method_owner(obj, attr):
-                continue
-
             func = Function.from_object(
                 self.fullname, attr, attr_obj, repo, obj)
             if func.is_vfunc:
@@ -124,6 +189,8 @@ class MethodsMixin(object):
 
 class PropertiesMixin(object):
 
+    __slots__ = ()
+
     def _parse_properties(self, repo, obj):
         if not hasattr(obj, "props"):
             self.properties = []
@@ -146,9 +213,11 @@ class PropertiesMixin(object):
 
 class ChildPropertiesMixin(object):
 
-    def _parse_child_properties(self, repo, obj):
+    __slots__ = ()
+
+    def _parse_child_properties(self, repo, obj, class_hierarchy):
         props = []
-        for spec in util.get_child_properties(obj):
+        for spec in class_hierarchy.get_child_properties(obj):
             prop = Property.from_child_pspec(repo, self.fullname, spec)
             props.append(prop)
         props.sort(key=lambda p: p.name)
@@ -157,9 +226,11 @@ class ChildPropertiesMixin(object):
 
 class StylePropertiesMixin(object):
 
-    def _parse_style_properties(self, repo, obj):
+    __slots__ = ()
+
+    def _parse_style_properties(self, repo, obj, class_hierarchy):
         props = []
-        for spec in util.get_style_properties(obj):
+        for spec in class_hierarchy.get_style_properties(obj):
             prop = Property.from_child_pspec(repo, self.fullname, spec)
             props.append(prop)
         props.sort(key=lambda p: p.name)
@@ -168,13 +239,13 @@ class StylePropertiesMixin(object):
 
 class FieldsMixin(object):
 
+    __slots__ = ()
+
     def _parse_fields(self, repo, obj):
         fields = []
-        for attr, field_info in util.iter_public_attr(obj):
+        for attr, field_info in util.iter_owned_public_attr(obj):
             if not util.is_field(field_info):
                 continue
-            if not util.is_field_owner(obj, attr):
-                continue
 
             py_type = field_info.py_type
             type_name = get_type_name(py_type)
@@ -188,15 +259,54 @@ class FieldsMixin(object):
         self.fields = fields
 
 
+def _get_flag_table(flags_type, single_bit=False):
+    """Returns a list of (value, name) tuples for all values of a
+    GFlags type, e.g. [(1, "READABLE"), ...]
+
+    If `single_bit` is True values with more or less than one bit set
+    and the private/static ones are left out.
+    """
+
+    table = []
+    for key in dir(flags_type):
+        if key != key.upper():
+            continue
+        flag = getattr(flags_type, key)
+        if single_bit:
+            if bin(flag).count("1") != 1:
+                continue
+            if key.startswith(("PRIVATE", "STATIC")):
+                continue
+        table.append((int(flag), key))
+    return table
+
+
+# (value, text) tuples sorted like the flags strings need them, so
+# decoding a flags value is just a loop over them.
+_PARAM_FLAGS_SHORT = sorted(
+    (flag, "".join([p[:1] for p in key.split("_")]).lower())
+    for flag, key in _get_flag_table(GObject.ParamFlags, True))
+_PARAM_FLAGS_STRING = sorted(
+    (flag, ":obj:`%s <GObject.ParamFlags.%s>`" % (key, key))
+    for flag, key in _get_flag_table(GObject.ParamFlags, True))
+_SIGNAL_FLAGS_STRING = sorted(
+    (flag, ":obj:`%s <GObject.SignalFlags.%s>`" % (key, key))
+    for flag, key in _get_flag_table(GObject.SignalFlags))
+
+
 class Property(BaseDocObject):
 
+    __slots__ = (
+        "name", "fullname", "info", "prop_name", "flags", "type_desc",
+        "value_desc", "short_desc")
+
     def __init__(self, parent_fullname, name, prop_name, flags,
                  type_desc, value_desc):
         self.fullname = parent_fullname + "." + name
-        self.name = name
+        self.name = sys.intern(name)
         self.info = None
 
-        self.prop_name = prop_name
+        self.prop_name = sys.intern(prop_name)
         self.flags = flags
         self.type_desc = type_desc
         self.value_desc = value_desc
@@ -204,39 +314,13 @@ class Property(BaseDocObject):
 
     @property
     def flags_short(self):
-        flags = []
-        for key in sorted(dir(GObject.ParamFlags)):
-            if key != key.upper():
-                continue
-            flag = getattr(GObject.ParamFlags, key)
-            if bin(flag).count("1") != 1:
-                continue
-            if key.startswith(("PRIVATE", "STATIC")):
-                continue
-
-            if self.flags & flag:
-                flags.append((
-                    flag, "".join([p[:1] for p in key.split("_")]).lower()))
-        return "/".join([x[1] for x in sorted(flags)])
+        flags = int(self.flags)
+        return "/".join([s for f, s in _PARAM_FLAGS_SHORT if flags & f])
 
     @property
     def flags_string(self):
-        descs = []
-
-        for key in sorted(dir(GObject.ParamFlags)):
-            if key != key.upper():
-                continue
-            flag = getattr(GObject.ParamFlags, key)
-            if bin(flag).count("1") != 1:
-                continue
-            if key.startswith(("PRIVATE", "STATIC")):
-                continue
-
-            if self.flags & flag:
-                d = ":obj:`%s <GObject.ParamFlags.%s>`" % (key, key)
-                descs.append((flag, d))
-
-        return ", ".join([x[1] for x in sorted(descs)])
+        flags = int(self.flags)
+        return ", ".join([s for f, s in _PARAM_FLAGS_STRING if flags & f])
 
     @classmethod
     def from_child_pspec(cls, repo, parent_fullname, spec):
@@ -304,12 +388,18 @@ class Property(BaseDocObject):
 
 class Signal(BaseDocObject):
 
+    __slots__ = (
+        "name", "fullname", "info", "sig_name", "flags", "signature",
+        "_signature_desc", "short_desc")
+
+    signature_desc = _DeferredText("_signature_desc")
+
     def __init__(self, parent_fullname, name, sig_name, flags):
         self.fullname = parent_fullname + "." + name
-        self.name = name
+        self.name = sys.intern(name)
         self.info = None
 
-        self.sig_name = sig_name
+        self.sig_name = sys.intern(sig_name)
         self.flags = flags
         self.signature_desc = None
         self.short_desc = None
@@ -331,8 +421,8 @@ class Signal(BaseDocObject):
         inst.signature = ssig
 
         if fsig:
-            signature_desc = fsig.to_rest_listing(
-                repo, inst.fullname, signal=True)
+            signature_desc = repo.defer(functools.partial(
+                fsig.to_rest_listing, repo, inst.fullname, signal=True))
         else:
             # FIXME pgi
             print("FIXME: signal: %s " % inst.fullname)
@@ -348,21 +438,14 @@ class Signal(BaseDocObject):
 
     @property
     def flags_string(self):
-        descs = []
-
-        for key in sorted(dir(GObject.SignalFlags)):
-            if key != key.upper():
-                continue
-            flag = getattr(GObject.SignalFlags, key)
-            if self.flags & flag:
-                d = ":obj:`%s <GObject.SignalFlags.%s>`" % (key, key)
-                descs.append((flag, d))
-
-        return ", ".join([x[1] for x in sorted(descs)])
+        flags = int(self.flags)
+        return ", ".join([s for f, s in _SIGNAL_FLAGS_STRING if flags & f])
 
 
 class PyProperty(BaseDocObject):
 
+    __slots__ = ("name", "fullname", "info")
+
     def __init__(self, parent_fullname, name):
         self.fullname = parent_fullname + "." + name
         self.name = name
@@ -388,6 +471,10 @@ class PyProperty(BaseDocObject):
 
 class PyClass(BaseDocObject, MethodsMixin):
 
+    __slots__ = (
+        "name", "fullname", "info", "signature", "methods", "vfuncs",
+        "pyprops")
+
     def __init__(self, namespace, name):
         self.fullname = namespace + "." + name
         self.name = name
@@ -454,6 +541,16 @@ class ClassNode(object):
 class Class(BaseDocObject, MethodsMixin, PropertiesMixin, SignalsMixin,
             ChildPropertiesMixin, StylePropertiesMixin, FieldsMixin):
 
+    __slots__ = (
+        "name", "fullname", "info", "is_interface", "is_abstract",
+        "is_gobject", "signature", "image_path", "gtype_struct",
+        "gtype_struct_methods_inherited", "methods", "methods_inherited",
+        "vfuncs", "vfuncs_inherited", "properties", "properties_inherited",
+        "signals", "signals_inherited", "fields", "fields_inherited",
+        "child_properties", "child_properties_inherited",
+        "style_properties", "style_properties_inherited", "base_tree",
+        "subclasses")
+
     def __init__(self, namespace, name):
         self.fullname = namespace + "." + name
         self.name = name
@@ -512,6 +609,7 @@ class Class(BaseDocObject, MethodsMixin, PropertiesMixin, SignalsMixin,
         name = obj.__name__
         module = util.import_namespace(namespace)
         version = util.get_module_version(module)
+        hierarchy = get_class_hierarchy(module)
 
         image_path = get_class_image_path(namespace, version, name)
         if not os.path.exists(image_path):
@@ -519,7 +617,7 @@ class Class(BaseDocObject, MethodsMixin, PropertiesMixin, SignalsMixin,
 
         def get_sub_tree(obj):
             x = []
-            for base in util.fake_bases(obj, ignore_redundant=True):
+            for base in hierarchy.get_bases(obj, ignore_redundant=True):
                 if base is object:
                     continue
                 x.append((ClassNode.from_class(base), get_sub_tree(base)))
@@ -531,8 +629,8 @@ class Class(BaseDocObject, MethodsMixin, PropertiesMixin, SignalsMixin,
         klass = cls(namespace, name)
         klass._parse_methods(repo, obj)
         klass._parse_properties(repo, obj)
-        klass._parse_child_properties(repo, obj)
-        klass._parse_style_properties(repo, obj)
+        klass._parse_child_properties(repo, obj, hierarchy)
+        klass._parse_style_properties(repo, obj, hierarchy)
         klass._parse_signals(repo, obj)
         klass._parse_fields(repo, obj)
 
@@ -564,7 +662,7 @@ class Class(BaseDocObject, MethodsMixin, PropertiesMixin, SignalsMixin,
         klass.is_gobject = util.is_object(obj) or util.is_iface(obj)
 
         def iter_gtype_structs(obj):
-            for base in util.fake_mro(obj):
+            for base in hierarchy.get_mro(obj):
                 if base is object:
                     continue
                 if util.is_iface(base):
@@ -585,7 +683,7 @@ class Class(BaseDocObject, MethodsMixin, PropertiesMixin, SignalsMixin,
         klass.base_tree = get_base_tree(obj)
 
         def iter_bases(obj):
-            for base in util.fake_mro(obj):
+            for base in hierarchy.get_mro(obj):
                 if base is object or base is obj:
                     continue
                 yield Class.from_object(repo, base)
@@ -609,7 +707,7 @@ class Class(BaseDocObject, MethodsMixin, PropertiesMixin, SignalsMixin,
             cls._inspected.add(module)
 
         subclasses = set()
-        for subc in util.fake_subclasses(obj):
+        for subc in hierarchy.get_subclasses(obj):
             if util.get_namespace(subc) == namespace:
                 subclasses.add(class_name(subc))
         subclasses = sorted(subclasses)
@@ -630,9 +728,12 @@ class Class(BaseDocObject, MethodsMixin, PropertiesMixin, SignalsMixin,
 
 class Field(BaseDocObject):
 
+    __slots__ = (
+        "name", "fullname", "info", "readable", "writable", "type_desc")
+
     def __init__(self, parent_fullname, name):
         self.fullname = parent_fullname + "." + name
-        self.name = name
+        self.name = sys.intern(name)
         self.info = None
 
         self.readable = False
@@ -665,9 +766,15 @@ class Field(BaseDocObject):
 
 class Function(BaseDocObject):
 
+    __slots__ = (
+        "name", "fullname", "info", "is_method", "is_static", "is_vfunc",
+        "signature", "_signature_desc")
+
+    signature_desc = _DeferredText("_signature_desc")
+
     def __init__(self, parent_fullname, name, is_method, is_static, is_vfunc):
         self.fullname = parent_fullname + "." + name
-        self.name = name
+        self.name = sys.intern(name)
         self.info = None
 
         self.is_method = is_method
@@ -678,9 +785,14 @@ class Function(BaseDocObject):
         self.signature_desc = u""
 
     def copy_for_new(self, parent_fullname):
+        """Returns a copy with a new parent.
+
+        The copy shares the DocInfo with this function, so neither of them
+        may change it afterwards.
+        """
+
         new = copy.copy(self)
         new.fullname = parent_fullname + "." + new.name
-        new.info = new.info.copy()
         return new
 
     @classmethod
@@ -751,7 +863,7 @@ class Function(BaseDocObject):
         # adjust according to the overrides
         signature_desc = instance.signature_desc
         signature = instance.signature
-        desc = instance.info.desc
+        info = instance.info
 
         # get the gir one
         func_sig = None
@@ -760,11 +872,13 @@ class Function(BaseDocObject):
             func_sig = FuncSignature.from_string(name, first_line)
             if not rest and func_sig:
                 signature = func_sig.to_simple_signature()
-                signature_desc = func_sig.to_rest_listing(repo, fullname)
+                signature_desc = repo.defer(functools.partial(
+                    func_sig.to_rest_listing, repo, fullname))
                 break
 
         def render(docs):
-            all_ = signature_desc + "\n\n" + desc
+            desc = info.desc
+            all_ = resolve(signature_desc) + "\n\n" + desc
             return repo.render_override_docs(docs, all=all_, docs=desc)
 
         if not docstrings:
@@ -775,11 +889,11 @@ class Function(BaseDocObject):
             if rest:
                 # multiple lines, should be an override docstring
                 if first_line.startswith("%s(" % name):
-                    desc = render(util.unindent(rest, False))
+                    info.desc = render(util.unindent(rest, False))
                     signature_desc = ""
                     signature = first_line[len(name):]
                 else:
-                    desc = render(util.unindent(docstrings[0], True))
+                    info.desc = render(util.unindent(docstrings[0], True))
                     signature_desc = ""
                     sig = FuncSignature.from_string(name, docstrings[-1])
                     if not sig:
@@ -788,20 +902,23 @@ class Function(BaseDocObject):
                         signature = sig.to_simple_signature()
             else:
                 if not func_sig:
-                    desc = render(util.unindent(docstrings[0], True))
+                    info.desc = render(util.unindent(docstrings[0], True))
                     signature_desc = ""
                     signature = get_signature_string(obj)
 
         assert signature
         instance.signature_desc = signature_desc
         instance.signature = signature
-        instance.info.desc = desc
 
         return instance
 
 
 class Structure(BaseDocObject, MethodsMixin, FieldsMixin):
 
+    __slots__ = (
+        "name", "fullname", "info", "signature", "methods", "vfuncs",
+        "fields")
+
     def __init__(self, namespace, name, signature):
         self.fullname = namespace + "." + name
         self.name = name
@@ -834,11 +951,16 @@ class Structure(BaseDocObject, MethodsMixin, FieldsMixin):
 
 
 class Union(Structure):
-    pass
+
+    __slots__ = ()
 
 
 class Flags(BaseDocObject, MethodsMixin):
 
+    __slots__ = (
+        "name", "fullname", "info", "signature", "base", "desc", "values",
+        "methods", "vfuncs")
+
     def __init__(self, namespace, name):
         self.fullname = namespace + "." + name
         self.name = name
@@ -887,9 +1009,11 @@ class Flags(BaseDocObject, MethodsMixin):
 
 class Constant(BaseDocObject):
 
+    __slots__ = ("name", "fullname", "info", "value")
+
     def __init__(self, parent_fullname, name, value):
         self.fullname = parent_fullname + "." + name
-        self.name = name
+        self.name = sys.intern(name)
         self.info = None
 
         self.value = value
@@ -1065,18 +1189,23 @@ class Module(BaseDocObject):
         symbol_mapping = SymbolMapping.from_module(repo, pymod)
         mod.symbol_mapping = symbol_mapping
 
-        mod.hierarchy = to_names(get_hierarchy(hierarchy_classes))
+        mod.hierarchy = to_names(get_hierarchy(
+            hierarchy_classes, get_class_hierarchy(pymod)))
         mod.project_summary = get_project_summary(repo.namespace, repo.version)
         mod.project_summary.dependencies = repo.get_dependencies()
 
-        print("%s-%s: unresolved links: %d" % (repo.namespace, repo.version,
-                                               repo.missed_links))
-
         return mod
 
 
 class DocInfo(BaseDocObject):
 
+    __slots__ = (
+        "name", "fullname", "_desc", "_shadowed_desc", "version_added",
+        "deprecated", "version_deprecated", "deprecation_desc")
+
+    desc = _DeferredText("_desc")
+    shadowed_desc = _DeferredText("_shadowed_desc")
+
     def __init__(self, fullname, name):
         self.fullname = fullname
         self.name = name
@@ -1090,16 +1219,14 @@ class DocInfo(BaseDocObject):
         self.version_deprecated = u""
         self.deprecation_desc = u""
 
-    def copy(self):
-        return copy.copy(self)
-
     @classmethod
     def from_object(cls, repo, type_, doc_object,
                     current_type=None, current_func=None):
         info = cls(doc_object.fullname, doc_object.name)
         info.desc, info.shadowed_desc = repo.lookup_docs(
             type_, info.fullname,
-            current_type=current_type, current_func=current_func)
+            current_type=current_type, current_func=current_func,
+            deferred=True)
         info.version_added, info.version_deprecated, info.deprecation_desc = \
             repo.lookup_meta(type_, info.fullname)
         info.deprecated = bool(
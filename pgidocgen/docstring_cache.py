@@ -0,0 +1,181 @@
+# Copyright 2026 Christoph Reiter
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+
+"""A persistent cache of docstrings converted to reST.
+
+The result of docstring_to_rest() only depends on the docstring, the
+context it is used in and the symbols the repository can resolve, so
+entries are keyed by a hash of all three. Each namespace gets its own
+cache file, which is loaded when the Repository is created and written
+back, least recently used entries first to go, after parsing.
+"""
+
+import os
+import pickle
+import hashlib
+from collections import OrderedDict
+
+from . import cache
+
+
+CACHE_DIR = None
+
+MAX_BYTES = 32 * 1024 ** 2
+"""The default size limit for the content of one cache file"""
+
+_FORMAT = 1
+# rough per entry overhead of the key and the stored tuple
+_ENTRY_OVERHEAD = 64
+
+
+def set_cache_dir(path):
+    """Sets the directory where rendered docstrings get cached"""
+
+    global CACHE_DIR
+
+    path = os.path.abspath(path)
+    os.makedirs(path, exist_ok=True)
+    CACHE_DIR = path
+
+
+def open_cache(namespace, version, fingerprint):
+    """Returns a loaded DocstringCache for the namespace or None if there
+    is no cache directory set.
+    """
+
+    if not CACHE_DIR:
+        return
+    path = os.path.join(
+        CACHE_DIR, "%s-%s.docstrings" % (namespace, version))
+    docstring_cache = DocstringCache(path, fingerprint)
+    docstring_cache.load()
+    return docstring_cache
+
+
+def _get_entry_size(value):
+    return len(value[0]) + _ENTRY_OVERHEAD
+
+
+class DocstringCache(object):
+    """Maps keys from get_key() to (rst, missed_links) tuples, where
+    `missed_links` is the number of links which couldn't be resolved while
+    rendering.
+
+    `fingerprint` identifies the symbols of the repository, entries created
+    with a different fingerprint are never returned and eventually get
+    evicted. The content is limited to about `max_bytes` when saving.
+    """
+
+    def __init__(self, path, fingerprint, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._fingerprint = fingerprint.encode("utf-8")
+        self._entries = OrderedDict()
+        self._size = 0
+        self._changed = False
+
+    def load(self):
+        """Loads the entries from disk, a missing or broken file results
+        in an empty cache.
+        """
+
+        try:
+            with open(self.path, "rb") as h:
+                data = pickle.load(h)
+            if data["format"] != _FORMAT:
+                raise ValueError("unknown format")
+            entries = OrderedDict(data["entries"])
+        except FileNotFoundError:
+            return
+        except (OSError, EOFError, ValueError, KeyError, TypeError,
+                pickle.UnpicklingError) as e:
+            print("Ignoring broken docstring cache %r: %r" % (self.path, e))
+            return
+
+        self._entries = entries
+        self._size = sum(_get_entry_size(v) for v in entries.values())
+
+    def get_key(self, docstring, current_type=None, current_func=None):
+        h = hashlib.sha256(self._fingerprint)
+        for part in (current_type, current_func):
+            h.update(b"\x00" if part is None else
+                     b"\x01" + part.encode("utf-8") + b"\x00")
+        h.update(docstring.encode("utf-8"))
+        return h.digest()[:16]
+
+    def get(self, key):
+        """Returns the cached value or None"""
+
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return
+        self.hits += 1
+        # the new order only gets saved together with other changes, so a
+        # run with only hits doesn't rewrite the file
+        self._entries.move_to_end(key)
+        return value
+
+    def __contains__(self, key):
+        # unlike get() this doesn't count as a hit or miss
+        return key in self._entries
+
+    def set(self, key, value):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= _get_entry_size(old)
+        self._entries[key] = value
+        self._size += _get_entry_size(value)
+        self._changed = True
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        """The approximate size of all entries in bytes"""
+
+        return self._size
+
+    def evict(self):
+        """Removes the least recently used entries until the size limit
+        is met.
+        """
+
+        entries = self._entries
+        while entries and self._size > self.max_bytes:
+            key, value = entries.popitem(last=False)
+            self._size -= _get_entry_size(value)
+            self._changed = True
+
+    def save(self):
+        """Evicts entries and writes the cache to disk if anything
+        has changed.
+        """
+
+        self.evict()
+        if not self._changed:
+            return
+        data = {
+            "format": _FORMAT,
+            "entries": list(self._entries.items()),
+        }
+        cache.write_atomic(
+            self.path, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+        self._changed = False
+
+    def get_stats(self):
+        """Returns a short summary of the hit rate"""
+
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return "%d hits, %d misses (%.0f%%), %d entries, %.1f MB" % (
+            self.hits, self.misses, rate, len(self._entries),
+            self._size / 1024 ** 2)
@@ -23,7 +23,7 @@ from .hierarchy import HierarchyGenerator
 from .mapping import MappingGenerator
 from . import genutil
 
-from ..namespace import get_namespace
+from ..namespace import get_dependency_graph
 from ..repo import Repository
 
 
@@ -89,9 +89,10 @@ API
 
 class ModuleGenerator(object):
 
-    def __init__(self, namespace, version):
+    def __init__(self, namespace, version, jobs=1):
         self._namespace = namespace
         self._version = version
+        self._jobs = jobs
 
     def write(self, dir_):
         try:
@@ -106,24 +107,20 @@ class ModuleGenerator(object):
             build directory is found, skipping it and all its deps.
             """
 
+            graph = get_dependency_graph()
             mods = []
-            nick = "%s-%s" % (namespace, version)
-            sub_dir = os.path.join(dir_, nick)
-            if os.path.exists(sub_dir):
-                return mods
-
-            def add_mod(namespace, version):
-                value = (namespace, version)
-                if value not in mods:
-                    mods.append(value)
-
-            add_mod(namespace, version)
-
-            ns = get_namespace(namespace, version)
-            for dep in ns.dependencies:
-                for res in get_to_write(dir_, *dep):
-                    add_mod(*res)
 
+            def visit(key):
+                if key in mods:
+                    return
+                sub_dir = os.path.join(dir_, "%s-%s" % key)
+                if os.path.exists(sub_dir):
+                    return
+                mods.append(key)
+                for dep in graph.get_dependencies(key):
+                    visit(dep)
+
+            visit((namespace, version))
             return mods
 
         mods = get_to_write(dir_, self._namespace, self._version)
@@ -138,7 +135,7 @@ class ModuleGenerator(object):
             return
 
         print("%s-%s: building..." % (namespace, version))
-        module = Repository(namespace, version).parse()
+        module = Repository(namespace, version).parse(self._jobs)
 
         class_gen = ClassGenerator()
         for klass in module.classes:
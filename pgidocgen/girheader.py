@@ -0,0 +1,168 @@
+# Copyright 2026 Christoph Reiter
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+
+"""Reads the header of gir files (everything before the content of the
+<namespace> element) without parsing the rest of the file.
+"""
+
+from xml.parsers import expat
+
+
+class GirHeader(object):
+    """The includes, packages and namespace attributes of a gir file"""
+
+    def __init__(self):
+        self.includes = []
+        """A list of (namespace, version) tuples"""
+
+        self.packages = []
+        """A list of pkg-config names, e.g. ["gtk+-3.0"]"""
+
+        self.namespace = None
+        self.version = None
+
+        self.shared_libraries = []
+        """e.g. ["libgtk-3.so.0", "libgdk-3.so.0"]"""
+
+        self.c_identifier_prefixes = []
+        self.c_symbol_prefixes = []
+
+
+class _HeaderDone(Exception):
+    pass
+
+
+def _split_list(value):
+    return [v for v in value.split(",") if v]
+
+
+def scan_gir_header(path):
+    """Returns a GirHeader for the gir file at `path`.
+
+    Parsing stops at the <namespace> start tag, so this only reads the
+    first few kilobytes of the file.
+    """
+
+    header = GirHeader()
+
+    def start(name, attrs):
+        if name == "include":
+            header.includes.append((attrs["name"], attrs["version"]))
+        elif name == "package":
+            header.packages.append(attrs["name"])
+        elif name == "namespace":
+            header.namespace = attrs.get("name")
+            header.version = attrs.get("version")
+            header.shared_libraries = _split_list(
+                attrs.get("shared-library", ""))
+            header.c_identifier_prefixes = _split_list(
+                attrs.get("c:identifier-prefixes", ""))
+            header.c_symbol_prefixes = _split_list(
+                attrs.get("c:symbol-prefixes", ""))
+            raise _HeaderDone
+
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = start
+    with open(path, "rb") as h:
+        try:
+            parser.ParseFile(h)
+        except _HeaderDone:
+            pass
+    return header
+
+
+class DependencyGraph(object):
+    """The dependencies between gir files, based on their headers.
+
+    Takes a {'{namespace}-{version}': path} dict like
+    util.get_gir_files(). Nodes are (namespace, version) tuples, headers
+    get scanned on first use.
+    """
+
+    def __init__(self, girs):
+        self._girs = girs
+        self._headers = {}
+
+    def __contains__(self, key):
+        return "%s-%s" % key in self._girs
+
+    def __iter__(self):
+        for name in sorted(self._girs):
+            yield tuple(name.split("-", 1))
+
+    def get_header(self, key):
+        """Returns the GirHeader for a (namespace, version) tuple.
+
+        Raises KeyError if there is no gir file for it.
+        """
+
+        if key not in self._headers:
+            path = self._girs["%s-%s" % key]
+            self._headers[key] = scan_gir_header(path)
+        return self._headers[key]
+
+    def get_dependencies(self, key):
+        """A list of (namespace, version) tuples for all direct dependencies
+        of the namespace.
+        """
+
+        deps = list(self.get_header(key).includes)
+
+        # these are not always included, but we need them
+        # for base types
+        if not deps:
+            if key[0] not in ("GObject", "GLib"):
+                deps.append(("GObject", "2.0"))
+
+        return deps
+
+    def get_all_dependencies(self, key):
+        """A list of (namespace, version) tuples for all transitive
+        dependencies of the namespace, nearest first.
+
+        Dependencies without a gir file are included, but not followed.
+        """
+
+        loaded = []
+        to_load = list(self.get_dependencies(key))
+        while to_load:
+            dep = to_load.pop()
+            if dep in loaded:
+                continue
+            loaded.append(dep)
+            if dep in self:
+                to_load.extend(self.get_dependencies(dep))
+
+        return loaded
+
+    def get_build_order(self, keys):
+        """Returns the given namespaces and all their dependencies sorted
+        so that each comes after its dependencies.
+
+        Raises ValueError in case of a dependency cycle.
+        """
+
+        order = []
+        done = set()
+        active = set()
+
+        def visit(key):
+            if key in done:
+                return
+            if key in active:
+                raise ValueError("dependency cycle: %s-%s" % key)
+            active.add(key)
+            if key in self:
+                for dep in sorted(self.get_dependencies(key)):
+                    visit(dep)
+            active.remove(key)
+            done.add(key)
+            order.append(key)
+
+        for key in keys:
+            visit(key)
+        return order
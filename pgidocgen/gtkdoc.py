@@ -23,6 +23,50 @@ MD_TEXT_LEVEL_ELEMENTS = {
     "structname", "title", "varname",
 }
 
+# block level patterns, matched against single lines
+_HEADING_1 = re.compile(
+    r"^[#][ \t]+(.+?)[ \t]*[#]*[ \t]*(?:{#([^}]+)})?[ \t]*$")
+_HEADING = re.compile(
+    r"^([#]{1,2})[ \t]+(.+?)[ \t]*[#]*[ \t]*(?:{#([^}]+)})?[ \t]*$")
+_SETEXT_1 = re.compile(r"^={4,}[ \t]*$")
+_SETEXT_2 = re.compile(r"^-{4,}[ \t]*$")
+_CODE_START = re.compile(
+    r'^[ \t]*\|\[[ ]*(?:<!-- language="([^"]+?)" -->)?')
+_CODE_END = re.compile(r"^[ \t]*\]\|(.*)")
+_DOCTYPE = re.compile(r"^[ ]*<!DOCTYPE")
+_MARKUP = re.compile(r"^[ ]*<\??(\w+)[^>]*([\/\?])?[ \t]*>")
+_LI = re.compile(r"^([ ]*)[*+-][ ](.*)")
+_LIST_ITEM = re.compile(r"^([ ]{0,4})\d+[.][ ]+(.*)")
+_QUOTE = re.compile(r"^[ ]*>[ ]?(.*)")
+_QUOTE_PREFIX = re.compile(r"^[ ]*>[ ]?")
+_INDENT = re.compile(r"^[ ]{0,4}")
+
+_LI_MARKER = "[*+-]"
+_LIST_ITEM_MARKER = "\\d+[.]"
+_MARKER_PATTERNS = dict(
+    (marker, re.compile(r"^([ ]{0,3})(%s)[ ](.*)" % marker))
+    for marker in [_LI_MARKER, _LIST_ITEM_MARKER])
+
+# span level patterns, matched at a position in the text
+_LINK_TEXT = re.compile(r"\[((?:[^][])*)\]")
+_LINK_URL = re.compile(
+    r"\([ ]*([^)'\"]*?)(?:[ ]+['\"](.+?)['\"])?[ ]*\)")
+_LINK_REF = re.compile(r"\s*\[([^\]<]*?)\]")
+_CODE_SPAN = re.compile(r"(`+)([^`]+?)\1(?!`)")
+
+_ENTITIES = [
+    ("&lt;", "<"),
+    ("&gt;", ">"),
+    ("&ast;", "*"),
+    ("&num;", "#"),
+    ("&percnt;", "%"),
+    ("&colon;", ":"),
+    ("&quot;", "\""),
+    ("&apos;", "'"),
+    ("&nbsp;", " "),
+    ("&amp;", "&"),  # Do this last, or the others get messed up.
+]
+
 
 def ConvertMarkDown(symbol, text):
     text = MarkDownParse(text, symbol)
@@ -30,8 +74,7 @@ def ConvertMarkDown(symbol, text):
 
 
 def MarkDownParse(text, symbol):
-    text = re.sub(r"\r\n", r"\n", text)
-    text = re.sub(r"\r", r"\n", text)
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
 
     lines = text.split(u"\n")
     text = MarkDownParseLines(lines, symbol, u"")
@@ -54,8 +97,9 @@ def MarkDownParseBlocks(linesref, symbol, context):
 
     for line in linesref:
         first_char = line[:1]
+        block_type = md_block["type"]
 
-        if md_block["type"] == "markup":
+        if block_type == "markup":
             if not md_block["closed"]:
                 if line.find(md_block["start"]) != -1:
                     md_block["depth"] += 1
@@ -70,16 +114,12 @@ def MarkDownParseBlocks(linesref, symbol, context):
                 # ("add to markup");
                 continue
 
-        deindented_line = line
-        deindented_line = re.sub(r"^\s+", "", deindented_line)
+        deindented_line = line.lstrip()
 
-        if md_block["type"] == "heading":
-            heading_match = re.search(
-                r"^[#][ \t]+(.+?)[ \t]*[#]*[ \t]*(?:{#([^}]+)})?[ \t]*$",
-                line)
+        if block_type == "heading":
             # a heading is ended by any level less than or equal
             if md_block["level"] == 1:
-                if re.search(r"^={4,}[ \t]*$", line):
+                if _SETEXT_1.search(line):
                     text = md_block["lines"].pop()
                     md_block["interrupted"] = 0
                     md_blocks.append(md_block)
@@ -91,7 +131,9 @@ def MarkDownParseBlocks(linesref, symbol, context):
                         "level": 1,
                     }
                     continue
-                elif heading_match:
+
+                heading_match = _HEADING_1.search(line)
+                if heading_match:
                     md_block["interrupted"] = 0
                     md_blocks.append(md_block)
                     md_block = {
@@ -107,10 +149,7 @@ def MarkDownParseBlocks(linesref, symbol, context):
                     md_block["lines"].append(line)
                     continue
             else:
-                heading_match = re.search(
-                    r"^([#]{1,2})[ \t]+(.+?)[ \t]*[#]*[ \t]*(?:{#([^}]+)})?[ \t]*$",
-                    line)
-                if re.search(r"^[=]{4,}[ \t]*$", line):
+                if _SETEXT_1.search(line):
                     text = md_block["lines"].pop()
                     md_block["interrupted"] = 0
                     md_blocks.append(md_block)
@@ -122,7 +161,7 @@ def MarkDownParseBlocks(linesref, symbol, context):
                         "level": 1,
                     }
                     continue
-                elif re.search(r"^[-]{4,}[ \t]*$", line):
+                elif _SETEXT_2.search(line):
                     text = md_block["lines"].pop()
                     md_block["interrupted"] = 0
                     md_blocks.append(md_block)
@@ -133,7 +172,9 @@ def MarkDownParseBlocks(linesref, symbol, context):
                         "level": 2,
                     }
                     continue
-                elif heading_match:
+
+                heading_match = _HEADING.search(line)
+                if heading_match:
                     md_block["interrupted"] = 0
                     md_blocks.append(md_block)
 
@@ -149,8 +190,8 @@ def MarkDownParseBlocks(linesref, symbol, context):
                     # push lines into the block until the end is reached
                     md_block["lines"].append(line)
                     continue
-        elif md_block["type"] == "code":
-            match = re.search(r"^[ \t]*\]\|(.*)", line)
+        elif block_type == "code":
+            match = _CODE_END.search(line)
             if match:
                 md_blocks.append(md_block)
                 md_block = {
@@ -166,14 +207,14 @@ def MarkDownParseBlocks(linesref, symbol, context):
             md_block["interrupted"] = 1
             continue
 
-        if md_block["type"] == "quote":
+        if block_type == "quote":
             if not md_block.get("interrupted"):
-                line = re.sub(r"^[ ]*>[ ]?", "", line)
+                line = _QUOTE_PREFIX.sub("", line, 1)
                 md_block["lines"].append(line)
                 continue
-        elif md_block["type"] == "li":
+        elif block_type == "li":
             marker = md_block["marker"]
-            marker_match = re.search(r"^([ ]{0,3})(%s)[ ](.*)" % marker, line)
+            marker_match = _MARKER_PATTERNS[marker].search(line)
             if marker_match:
                 indentation = marker_match.group(1)
                 if md_block["indentation"] != indentation:
@@ -181,7 +222,7 @@ def MarkDownParseBlocks(linesref, symbol, context):
                 else:
                     lines = marker_match.group(3)
                     ordered = md_block["ordered"]
-                    lines = re.sub(r"^[ ]{0,4}", "", lines)
+                    lines = _INDENT.sub("", lines, 1)
                     md_block["last"] = 0
                     md_blocks.append(md_block)
                     md_block = {
@@ -198,24 +239,19 @@ def MarkDownParseBlocks(linesref, symbol, context):
             if md_block.get("interrupted"):
                 if first_char == " ":
                     md_block["lines"].append("")
-                    line = re.sub(r"^[ ]{0,4}", "", line)
+                    line = _INDENT.sub("", line, 1)
                     md_block["lines"].append(line)
                     md_block["interrupted"] = 0
                     continue
             else:
-                line = re.sub(r"^[ ]{0,4}", "", line)
+                line = _INDENT.sub("", line, 1)
                 md_block["lines"].append(line)
                 continue
 
         # indentation sensitive types
         # ("parsing '$line'");
 
-        heading_match = re.search(
-            r"^([#]{1,2})[ \t]+(.+?)[ \t]*[#]*[ \t]*(?:{#([^}]+)})?[ \t]*$",
-            line)
-        code_match = re.search(
-            r'^[ \t]*\|\[[ ]*(?:<!-- language="([^"]+?)" -->)?', line)
-
+        heading_match = _HEADING.search(line)
         if heading_match:
             # atx heading (#)
             md_blocks.append(md_block)
@@ -228,7 +264,7 @@ def MarkDownParseBlocks(linesref, symbol, context):
                 "level": len(heading_match.group(1)),
             }
             continue
-        elif re.search(r"^={4,}[ \t]*$", line):
+        elif _SETEXT_1.search(line):
             # setext heading (====)
 
             if md_block["type"] == "paragraph" and md_block.get("interrupted"):
@@ -237,7 +273,7 @@ def MarkDownParseBlocks(linesref, symbol, context):
                 md_block["lines"] = []
                 md_block["level"] = 1
             continue
-        elif re.search(r"^-{4,}[ \t]*$", line):
+        elif _SETEXT_2.search(line):
             # setext heading (-----)
 
             if md_block["type"] == "paragraph" and md_block.get("interrupted"):
@@ -246,7 +282,9 @@ def MarkDownParseBlocks(linesref, symbol, context):
                 md_block["lines"] = []
                 md_block["level"] = 2
             continue
-        elif code_match:
+
+        code_match = _CODE_START.search(line)
+        if code_match:
             # code
             md_block["interrupted"] = 1
             md_blocks.append(md_block)
@@ -257,12 +295,8 @@ def MarkDownParseBlocks(linesref, symbol, context):
             }
             continue
 
-        markup_match = re.search(r"^[ ]*<\??(\w+)[^>]*([\/\?])?[ \t]*>", line)
-        li_match = re.search(r"^([ ]*)[*+-][ ](.*)", line)
-        quote_match = re.search(r"^[ ]*>[ ]?(.*)", line)
-
         # indentation insensitive types
-        if re.search(r"^[ ]*<!DOCTYPE", line):
+        if _DOCTYPE.search(line):
             md_blocks.append(md_block)
             md_block = {
                 "type": "markup",
@@ -272,14 +306,23 @@ def MarkDownParseBlocks(linesref, symbol, context):
                 "closed": 0,
                 "depth": 0,
             }
-        elif markup_match:
+            markup_match = li_match = quote_match = None
+        else:
+            markup_match = _MARKUP.search(line)
+            li_match = quote_match = None
+            if not markup_match:
+                li_match = _LI.search(line)
+                if not li_match:
+                    quote_match = _QUOTE.search(line)
+
+        if markup_match:
             # markup, including <?xml version="1.0"?>
             tag = markup_match.group(1)
             is_self_closing = markup_match.group(2) is not None
 
             # skip link markdown
             # TODO(ensonic): consider adding more uri schemes (ftp, ...)
-            if re.search(r"^https?", tag):
+            if tag.startswith("http"):
                 # ("skipping link '$tag'");
                 pass
             else:
@@ -311,7 +354,7 @@ def MarkDownParseBlocks(linesref, symbol, context):
                         "closed": 0,
                         "depth": 0,
                     }
-                    if re.search(r"<\/%s>" % tag, deindented_line):
+                    if md_block["end"] in deindented_line:
                         md_block["closed"] = 1
                     continue
                 else:
@@ -319,7 +362,7 @@ def MarkDownParseBlocks(linesref, symbol, context):
                         # ("text level docbook '$tag' in '".$md_block->{"type"}."' state");
                         # TODO(ensonic): handle nesting
                         if not scanning_for_end_of_text_level_tag:
-                            if re.search(r"<\/%s>" % tag, deindented_line):
+                            if "</" + tag + ">" in deindented_line:
                                 # ("new text level markup '$tag'");
                                 md_block["start"] = "<" + tag + ">"
                                 md_block["end"] = "</" + tag + ">"
@@ -334,13 +377,13 @@ def MarkDownParseBlocks(linesref, symbol, context):
             md_blocks.append(md_block)
             lines = li_match.group(2)
             indentation = li_match.group(1)
-            lines = re.sub(r"^[ ]{0,4}", "", lines)
+            lines = _INDENT.sub("", lines, 1)
 
             md_block = {
                 "type": "li",
                 "ordered": 0,
                 "indentation": indentation,
-                "marker": "[*+-]",
+                "marker": _LI_MARKER,
                 "first": 1,
                 "last": 1,
                 "lines": [lines],
@@ -355,18 +398,18 @@ def MarkDownParseBlocks(linesref, symbol, context):
             continue
 
         # list item
-        list_item_match = re.search(r"^([ ]{0,4})\d+[.][ ]+(.*)", line)
+        list_item_match = _LIST_ITEM.search(line)
         if list_item_match:
             md_blocks.append(md_block)
             lines = list_item_match.group(2)
             indentation = list_item_match.group(1)
-            lines = re.sub("^[ ]{0,4}", "", lines)
+            lines = _INDENT.sub("", lines, 1)
 
             md_block = {
                 "type": "li",
                 "ordered": 1,
                 "indentation": indentation,
-                "marker": "\\d+[.]",
+                "marker": _LIST_ITEM_MARKER,
                 "first": 1,
                 "last": 1,
                 "lines": [lines],
@@ -401,80 +444,64 @@ def MarkDownParseBlocks(linesref, symbol, context):
 
 
 def ReplaceEntities(text, symbol):
-    entities = [
-        ["&lt;", "<"],
-        ["&gt;", ">"],
-        ["&ast;", "*"],
-        ["&num;", "#"],
-        ["&percnt;", "%"],
-        ["&colon;", ":"],
-        ["&quot;", "\""],
-        ["&apos;", "'"],
-        ["&nbsp;", " "],
-        ["&amp;", "&"],  # Do this last, or the others get messed up.
-    ]
+    if "&" not in text:
+        return text
 
     # Expand entities in <programlisting> even inside CDATA since
     # we changed the definition of |[ to add CDATA
-    for a, b in entities:
-        text = re.sub(re.escape(a), b, text)
+    for a, b in _ENTITIES:
+        text = text.replace(a, b)
 
     return text
 
 
 def MarkDownParseSpanElementsInner(text, markersref):
-    markup = ""
-    markers = dict.fromkeys(markersref, 1)
-
-    while text != "":
+    markup = []
+
+    # the position of the next occurrence of each marker, markers which
+    # no longer occur get removed
+    positions = {}
+    for marker in markersref:
+        marker_position = text.find(marker)
+        if marker_position >= 0:
+            positions[marker] = marker_position
+
+    # instead of cutting off the handled text we move the position forward
+    pos = 0
+    end = len(text)
+    while pos < end:
         closest_marker = ""
-        closest_marker_index = 0
         closest_marker_position = -1
-        text_marker = ""
-        i = 0
         offset = 0
 
-        for marker, use in markers.items():
-            if not use:
-                continue
-
-            try:
-                marker_position = text.index(marker)
-            except ValueError:
-                marker_position = -1
-
-            if marker_position < 0:
-                markers[marker] = 0
-                continue
+        for marker, marker_position in list(positions.items()):
+            if marker_position < pos:
+                marker_position = text.find(marker, pos)
+                if marker_position < 0:
+                    del positions[marker]
+                    continue
+                positions[marker] = marker_position
 
             if closest_marker == "" or marker_position < closest_marker_position:
                 closest_marker = marker
-                closest_marker_index = i
                 closest_marker_position = marker_position
 
-        closest_marker_index  # pyflakes
+        if closest_marker_position < 0:
+            markup.append(text[pos:])
+            break
 
-        if closest_marker_position >= 0:
-            text_marker = text[closest_marker_position:]
-
-        if text_marker == "":
-            markup += text
-            text = ""
-            continue
-
-        markup += text[:closest_marker_position]
-        text = text[closest_marker_position:]
-        markers_rest = {k: v for k, v in markers.items() if v and k != closest_marker}
+        markup.append(text[pos:closest_marker_position])
+        pos = closest_marker_position
 
         if closest_marker == "![" or closest_marker == "[":
             element = None
 
             # PYTHONTODO: Python doesn't support recursive regexp. I just
             # removed it from the pattern; not sure what it breaks
-            match = re.search(r"\[((?:[^][])*)\]", text)
-            if "]" in text and match:
+            match = _LINK_TEXT.search(text, pos)
+            if match:
                 element = {
-                    "!": text[:1] == "!",
+                    "!": text[pos] == "!",
                     "a": match.group(1),
                 }
 
@@ -482,9 +509,8 @@ def MarkDownParseSpanElementsInner(text, markersref):
                 if element["!"]:
                     offset += 1
 
-                remaining_text = text[offset:]
-                remaining_match = re.search(r"^\([ ]*([^)'\"]*?)(?:[ ]+['\"](.+?)['\"])?[ ]*\)", remaining_text)
-                remaining_match2 = re.search(r"^\s*\[([^\]<]*?)\]", remaining_text)
+                remaining_match = _LINK_URL.match(text, pos + offset)
+                remaining_match2 = _LINK_REF.match(text, pos + offset)
                 if remaining_match is not None:
                     element["»"] = remaining_match.group(1)
                     try:
@@ -499,54 +525,57 @@ def MarkDownParseSpanElementsInner(text, markersref):
                     element = None
 
             if element is not None:
+                markers_rest = [
+                    k for k in positions if k != closest_marker]
+
                 if element.get("»"):
                     element["»"] = element["»"].replace("&", "&amp;")
                     element["»"] = element["»"].replace("<", "&lt;")
 
                 if element.get("!"):
-                    markup += "<inlinemediaobject><imageobject><imagedata fileref=\"" + element["»"] + "\"></imagedata></imageobject>"
+                    markup.append("<inlinemediaobject><imageobject><imagedata fileref=\"" + element["»"] + "\"></imagedata></imageobject>")
                     if "a" in element:
-                        markup += "<textobject><phrase>" + element["a"] + "</phrase></textobject>"
-                    markup += "</inlinemediaobject>"
+                        markup.append("<textobject><phrase>" + element["a"] + "</phrase></textobject>")
+                    markup.append("</inlinemediaobject>")
                 elif element.get("ref"):
                     element["a"] = MarkDownParseSpanElementsInner(element["a"], markers_rest)
-                    markup += "<link linkend=\"" + element["ref"] + "\""
+                    markup.append("<link linkend=\"" + element["ref"] + "\"")
                     if "#" in element:
                         # title attribute not supported
                         pass
-                    markup += ">" + element["a"] + "</link>"
+                    markup.append(">" + element["a"] + "</link>")
                 else:
                     element["a"] = MarkDownParseSpanElementsInner(element["a"], markers_rest)
-                    markup += "<ulink url=\"" + element.get("»", "") + "\""
+                    markup.append("<ulink url=\"" + element.get("»", "") + "\"")
                     if "#" in element:
                         # title attribute not supported
                         pass
-                    markup += ">" + element["a"] + "</ulink>"
+                    markup.append(">" + element["a"] + "</ulink>")
             else:
-                markup += closest_marker
+                markup.append(closest_marker)
                 if closest_marker == "![":
                     offset = 2
                 else:
                     offset = 1
         elif closest_marker == "`":
-            match = re.search(r"^(`+)([^`]+?)\1(?!`)", text)
+            match = _CODE_SPAN.match(text, pos)
             if match:
                 element_text = match.group(2)
-                markup += "<literal>" + element_text + "</literal>"
+                markup.append("<literal>" + element_text + "</literal>")
                 offset = len(match.group())
             else:
-                markup += "`"
+                markup.append("`")
                 offset += 1
         else:
             # PYTHONTODO: we handle inline references when parsing docbook
             # so just skip anything we don't handle
-            markup += closest_marker
+            markup.append(closest_marker)
             offset += len(closest_marker)
 
         if offset > 0:
-            text = text[offset:]
+            pos += offset
 
-    return markup
+    return "".join(markup)
 
 
 def MarkDownParseSpanElements(text):
@@ -561,22 +590,23 @@ def ExpandAbbreviations(symbol, text):
 
 
 def MarkDownOutputDocBook(blocksref, symbol, context):
-    output = u""
+    output = []
     blocks = blocksref
 
     for block in blocks:
-        if block["type"] == "paragraph":
+        block_type = block["type"]
+        if block_type == "paragraph":
             text = MarkDownParseSpanElements(block["text"])
-            if context == "li" and output == "":
+            if context == "li" and not output:
                 if block.get("interrupted"):
-                    output += "\n<para>" + text + "</para>\n"
+                    output.append("\n<para>" + text + "</para>\n")
                 else:
-                    output += "<para>" + text + "</para>"
+                    output.append("<para>" + text + "</para>")
                     if len(blocks) > 0:
-                        output += "\n"
+                        output.append("\n")
             else:
-                output += "<para>" + text + "</para>\n"
-        elif block["type"] == "heading":
+                output.append("<para>" + text + "</para>\n")
+        elif block_type == "heading":
             title = MarkDownParseSpanElements(block["text"])
             if block["level"] == 1:
                 tag = "refsect2"
@@ -585,53 +615,53 @@ def MarkDownOutputDocBook(blocksref, symbol, context):
 
             text = MarkDownParseLines(block["lines"], symbol, "heading")
             if block.get("id"):
-                output += ("<%s id=\"" % tag) + block["id"] + "\">"
+                output.append(("<%s id=\"" % tag) + block["id"] + "\">")
             else:
-                output += "<%s>" % tag
+                output.append("<%s>" % tag)
 
-            output += "<title>%s</title>%s</%s>\n" % (title, text, tag)
-        elif block["type"] == "li":
+            output.append("<title>%s</title>%s</%s>\n" % (title, text, tag))
+        elif block_type == "li":
             tag = "itemizedlist"
 
             if block["first"]:
                 if block["ordered"]:
                     tag = "orderedlist"
-                output += "<%s>\n" % tag
+                output.append("<%s>\n" % tag)
 
             if block.get("interrupted"):
                 block["lines"].append("")
 
             text = MarkDownParseLines(block["lines"], symbol, "li")
-            output += "<listitem>%s</listitem>\n" % text
+            output.append("<listitem>%s</listitem>\n" % text)
 
             if block["last"]:
                 if block["ordered"]:
                     tag = "orderedlist"
-                output += "</%s>\n" % tag
+                output.append("</%s>\n" % tag)
 
-        elif block["type"] == "quote":
+        elif block_type == "quote":
             text = MarkDownParseLines(block["lines"], symbol, "quote")
-            output += "<blockquote>\n%s</blockquote>\n" % text
-        elif block["type"] == "code":
+            output.append("<blockquote>\n%s</blockquote>\n" % text)
+        elif block_type == "code":
             tag = "programlisting"
 
             if block["language"]:
                 if block["language"] == "plain":
-                    output += "<informalexample><screen><![CDATA[\n"
+                    output.append("<informalexample><screen><![CDATA[\n")
                     tag = "screen"
                 else:
-                    output += "<informalexample><programlisting language=\"%s\"><![CDATA[\n" % block["language"]
+                    output.append("<informalexample><programlisting language=\"%s\"><![CDATA[\n" % block["language"])
             else:
-                output += "<informalexample><programlisting><![CDATA[\n"
+                output.append("<informalexample><programlisting><![CDATA[\n")
 
             for line in block["lines"]:
-                output += ReplaceEntities(line, symbol) + "\n"
+                output.append(ReplaceEntities(line, symbol) + "\n")
 
-            output += "]]></%s></informalexample>\n" % tag
-        elif block["type"] == "markup":
+            output.append("]]></%s></informalexample>\n" % tag)
+        elif block_type == "markup":
             text = ExpandAbbreviations(symbol, block["text"])
-            output += text + "\n"
+            output.append(text + "\n")
         else:
-            output += block["text"] + "\n"
+            output.append(block["text"] + "\n")
 
-    return output
+    return u"".join(output)
@@ -10,7 +10,8 @@
 import sys
 import argparse
 
-from . import create, build, stubs, create_debian, update
+from . import create, build, stubs, create_debian, update, warm_cache, \
+    bench_parser
 
 
 def main(argv):
@@ -22,6 +23,8 @@ def main(argv):
     stubs.add_parser(subparser)
     create_debian.add_parser(subparser)
     update.add_parser(subparser)
+    warm_cache.add_parser(subparser)
+    bench_parser.add_parser(subparser)
 
     args = parser.parse_args(argv[1:])
     if not hasattr(args, "func"):
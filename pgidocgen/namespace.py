@@ -6,70 +6,374 @@
 # version 2.1 of the License, or (at your option) any later version.
 
 import os
-import gc
+import sys
 import ctypes
 import re
-import shelve
+import mmap
+import pickle
+import struct
+import hashlib
 import inspect
 import collections
-from xml.dom import minidom
+from xml.parsers import expat
 
-from . import util
+from . import util, cache
 from .girdata import load_doc_references
+from .girheader import DependencyGraph
 from .overrides import parse_override_docs
+from .symbols import SymbolTable, dump_symbol_table
 
 
-SHELVE_CACHE = None
+CACHE_DIR = None
 
 
-def set_cache_prefix_path(path):
-    global SHELVE_CACHE
+def set_cache_dir(path):
+    """Sets the directory where parsed namespaces get cached"""
+
+    global CACHE_DIR
 
     path = os.path.abspath(path)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    SHELVE_CACHE = path
+    os.makedirs(path, exist_ok=True)
+    CACHE_DIR = path
+
+
+def _get_cache_digest(namespace, version):
+    """A hash of everything which goes into a Namespace: the gir, the
+    typelib and pgidocgen itself.
+    """
+
+    key = "%s-%s" % (namespace, version)
+    gir_path = util.get_gir_files()[key]
+    typelib_path = util.get_typelib_path(namespace, version)
+    return cache.hash_files([gir_path, typelib_path])
+
+
+_CACHE_MAGIC = b"PGIDOCGEN-NS-1\n"
+_CACHE_HEADER = struct.Struct("<Q")
+
+
+class _CacheEntry(object):
+    """A namespace cache entry, split into sections which can be loaded
+    independently.
+
+    Layout: magic, length of the index, the pickled index mapping section
+    names to (offset, size) and then the sections, each 8 byte aligned.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            if self._file.read(len(_CACHE_MAGIC)) != _CACHE_MAGIC:
+                raise ValueError("invalid cache header")
+            size, = _CACHE_HEADER.unpack(
+                self._file.read(_CACHE_HEADER.size))
+            self._index = pickle.loads(self._file.read(size))
+        except BaseException:
+            self._file.close()
+            raise
+        self._start = -(-self._file.tell() // 8) * 8
+        self._mmap = None
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def read(self, name):
+        """Returns the content of a section as bytes.
+
+        Doesn't use the file position, which is shared with processes
+        forked after the entry was opened.
+        """
+
+        offset, size = self._index[name]
+        return os.pread(self._file.fileno(), size, self._start + offset)
+
+    def map(self, name):
+        """Returns a (mmap, offset, size) tuple for a section. The read-only
+        memory map of the entry is shared with all other processes using
+        the same entry.
+        """
+
+        if self._mmap is None:
+            self._mmap = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        offset, size = self._index[name]
+        return self._mmap, self._start + offset, size
+
+    @staticmethod
+    def dump(sections):
+        """Returns the cache entry content for a mapping of section names
+        to bytes.
+        """
+
+        index = {}
+        blobs = []
+        offset = 0
+        for name, data in sorted(sections.items()):
+            index[name] = (offset, len(data))
+            padding = -len(data) % 8
+            blobs.append(data + b"\x00" * padding)
+            offset += len(data) + padding
+        header = pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)
+        parts = [_CACHE_MAGIC, _CACHE_HEADER.pack(len(header)), header]
+        parts.append(b"\x00" * (-sum(map(len, parts)) % 8))
+        return b"".join(parts + blobs)
+
+
+def _load_cached_namespace(path, namespace, version):
+    try:
+        entry = _CacheEntry(path)
+    except FileNotFoundError:
+        return
+    except (OSError, EOFError, ValueError, struct.error,
+            pickle.UnpicklingError) as e:
+        print("Ignoring broken cache entry %r: %r" % (path, e))
+        return
+    return Namespace(namespace, version, _cache_entry=entry)
+
+
+def _store_cached_namespace(path, ns):
+    sections = {}
+    for k, v in type(ns).__dict__.items():
+        if isinstance(v, _section_property):
+            sections[k] = v.dump(getattr(ns, k))
+    cache.write_atomic(path, _CacheEntry.dump(sections))
+
+
+def get_cache_entry_path(namespace, version):
+    """Returns the path of the cache entry for the current content of the
+    namespace or None if there is no cache directory set.
+
+    The file might not exist yet.
+    """
+
+    if not CACHE_DIR:
+        return
+    key = "%s-%s" % (namespace, version)
+    digest = _get_cache_digest(namespace, version)
+    return cache.get_entry_path(CACHE_DIR, key, digest, ".cache")
+
+
+def get_dependency_graph(_cache=[]):
+    """Returns a DependencyGraph for all gir files found"""
+
+    if not _cache:
+        _cache.append(DependencyGraph(util.get_gir_files()))
+    return _cache[0]
 
 
 def get_namespace(namespace, version, _cache={}):
 
     key = str(namespace + "-" + version)
-    protocol = 3
 
     if key not in _cache:
-        if SHELVE_CACHE:
-            d = shelve.open(SHELVE_CACHE, protocol=protocol)
-            if key in d:
-                _cache[key] = d[key]
-                d.close()
-            else:
-                d.close()
+        if CACHE_DIR:
+            digest = _get_cache_digest(namespace, version)
+            path = cache.get_entry_path(CACHE_DIR, key, digest, ".cache")
+            ns = _load_cached_namespace(path, namespace, version)
+            if ns is None:
                 ns = Namespace(namespace, version)
-                # make sure we save a fully populated instance
-                for k, v in list(type(ns).__dict__.items()):
-                    if isinstance(v, util.cached_property):
-                        getattr(ns, k)
-                d = shelve.open(SHELVE_CACHE, protocol=protocol)
-                d[key] = ns
-                d.close()
-                _cache[key] = ns
+                _store_cached_namespace(path, ns)
+                cache.remove_stale(CACHE_DIR, key, digest, ".cache")
+            _cache[key] = ns
         else:
             _cache[key] = Namespace(namespace, version)
 
     return _cache[key]
 
 
-def _get_dom(path, _cache={}):
-    # caches the last dom
-    if path in _cache:
-        return _cache[path]
-    _cache.clear()
-    # reduce peak memory
-    gc.collect()
+def _iter_gir_chunks(path, size=2 ** 16):
+    """Yields the content of a gir file in chunks with the character
+    references expat can't handle replaced.
+    """
+
     with open(path, "rb") as h:
-        data = h.read()
-        data = re.sub(b"(&#x1c;)", b"?", data)
-        _cache[path] = minidom.parseString(data)
-    return _cache[path]
+        tail = b""
+        while True:
+            data = h.read(size)
+            if not data:
+                break
+            data = tail + data
+            # don't split a reference between two chunks
+            index = data.rfind(b"&", max(len(data) - 5, 0))
+            if index != -1:
+                data, tail = data[:index], data[index:]
+            else:
+                tail = b""
+            yield data.replace(b"&#x1c;", b"?")
+        yield tail.replace(b"&#x1c;", b"?")
+
+
+class _GirElement(object):
+    """An element as seen by the streaming gir parser.
+
+    Only the attributes and the bits of content we need are kept, children
+    are gone once they are closed.
+    """
+
+    __slots__ = ("tag", "attrs", "parent", "doc", "doc_deprecated",
+                 "instance_param", "is_empty", "doc_context")
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+
+        # text of the first <doc>/<doc-deprecated> child
+        self.doc = None
+        self.doc_deprecated = None
+        # name of the first <instance-parameter> descendant
+        self.instance_param = None
+        # no child elements except <source-position>
+        self.is_empty = True
+        # cached by _DocsCollector
+        self.doc_context = None
+
+    def get(self, name):
+        return self.attrs.get(name, "")
+
+    def has(self, name):
+        return name in self.attrs
+
+
+class GirData(object):
+    """All the information we need from a gir file"""
+
+    def __init__(self):
+        self.raw_types = None
+        self.docs = None
+        self.private = set()
+        self.includes = []
+        self.shared_libraries = []
+
+
+class _GirParser(object):
+
+    def __init__(self):
+        self._stack = []
+        self._text = None
+        self._namespace_seen = False
+        self._types = _TypesCollector()
+        self._docs = _DocsCollector()
+        self.data = GirData()
+
+    def parse(self, path):
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        parser.CharacterDataHandler = self._char_data
+
+        for chunk in _iter_gir_chunks(path):
+            parser.Parse(chunk, False)
+        parser.Parse(b"", True)
+
+        self.data.raw_types = self._types.finish()
+        self.data.docs = self._docs.finish()
+        return self.data
+
+    def _start(self, tag, attrs):
+        stack = self._stack
+        parent = stack[-1] if stack else None
+        elm = _GirElement(tag, attrs, parent)
+        if parent is not None and tag != "source-position":
+            parent.is_empty = False
+
+        if tag == "doc" or tag == "doc-deprecated":
+            self._text = []
+        elif tag == "instance-parameter":
+            name = elm.get("name")
+            while parent is not None:
+                if parent.instance_param is None:
+                    parent.instance_param = name
+                parent = parent.parent
+        elif tag == "namespace" and not self._namespace_seen:
+            self._namespace_seen = True
+            shared_library = elm.get("shared-library")
+            self.data.shared_libraries = \
+                shared_library.split(",") if shared_library else []
+
+        stack.append(elm)
+
+    def _end(self, tag):
+        elm = self._stack.pop()
+        parent = elm.parent
+
+        if tag == "doc":
+            if parent.doc is None:
+                parent.doc = "".join(self._text)
+            self._text = None
+        elif tag == "doc-deprecated":
+            if parent.doc_deprecated is None:
+                parent.doc_deprecated = "".join(self._text)
+            self._text = None
+        else:
+            self._types.handle(elm)
+            self._docs.handle(elm)
+            if tag == "record":
+                _handle_private(self.data.private, elm)
+            elif tag == "include":
+                self.data.includes.append(
+                    (elm.get("name"), elm.get("version")))
+
+    def _char_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+
+def parse_gir(path):
+    """Parses the gir file at `path` in a single streaming pass.
+
+    Unlike a DOM only the currently open elements are kept in memory.
+    Returns a GirData instance.
+    """
+
+    return _GirParser().parse(path)
+
+
+class _GirCache(object):
+    """A LRU cache for parse_gir() results, bounded by the total size of the
+    parsed gir files. The most recently used entry is always kept, even if
+    it exceeds the budget.
+
+    The docs of the cached results already have fixup_since() applied and
+    must not be changed.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, path):
+        entry = self._entries.get(path)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(path)
+            return entry[1]
+
+        self.misses += 1
+        gir = parse_gir(path)
+        _fixup_all_added_since(gir.docs)
+        size = os.path.getsize(path)
+        self._entries[path] = (size, gir)
+        self.size += size
+        self.evict()
+        return gir
+
+    def evict(self):
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            size, gir = self._entries.popitem(last=False)[1]
+            self.size -= size
+
+
+# parsed data takes about as much memory as the gir file
+_GIR_CACHE = _GirCache(64 * 1024 ** 2)
+
+
+def _get_gir(path):
+    return _GIR_CACHE.get(path)
 
 
 def fixup_since(text):
@@ -103,25 +407,23 @@ def fixup_since(text):
 def _fixup_all_added_since(all_docs):
     """Applies fixup_since() to all docs"""
 
+    # the same entry can be in multiple tables, and the shared empty one
+    # has nothing to fix and must not be changed
+    done = set([id(_EMPTY_DOC_ENTRY)])
     for type_, type_docs in all_docs.items():
-        for k, e in type_docs.items():
-            docs = e.docs
-            version = e.version
-            deprecated_version = e.deprecated_version
-            deprecated = e.deprecated
-            changed = False
-
-            if not version:
-                docs, version = fixup_since(docs)
-                changed = True
+        for e in type_docs.values():
+            if id(e) in done:
+                continue
+            done.add(id(e))
 
-            if not deprecated_version:
-                deprecated, deprecated_version = fixup_since(deprecated)
-                changed = True
+            if not e.version:
+                e.docs, version = fixup_since(e.docs)
+                e.version = _intern(version)
 
-            if changed:
-                type_docs[k] = DocEntry(docs, version,
-                                        deprecated_version, deprecated)
+            if not e.deprecated_version:
+                deprecated, deprecated_version = fixup_since(e.deprecated)
+                e.deprecated = _intern(deprecated)
+                e.deprecated_version = _intern(deprecated_version)
 
 
 def get_versions(all_docs):
@@ -137,15 +439,109 @@ def get_versions(all_docs):
     return versions
 
 
-DocEntry = collections.namedtuple(
-    "DocEntry", ["docs", "version", "deprecated_version", "deprecated"])
+def _intern(text):
+    return sys.intern(text) if text else ""
+
+
+class DocEntry(object):
+    """The docs of one gir element.
+
+    Versions and deprecation texts repeat a lot, so they get interned and
+    all empty values share the same string. Can be unpacked like a
+    (docs, version, deprecated_version, deprecated) tuple.
+    """
+
+    __slots__ = ("docs", "version", "deprecated_version", "deprecated")
+
+    def __init__(self, docs, version, deprecated_version, deprecated):
+        self.docs = docs or ""
+        self.version = _intern(version)
+        self.deprecated_version = _intern(deprecated_version)
+        self.deprecated = _intern(deprecated)
+
+    def _astuple(self):
+        return (self.docs, self.version, self.deprecated_version,
+                self.deprecated)
+
+    def __iter__(self):
+        return iter(self._astuple())
+
+    def __eq__(self, other):
+        if not isinstance(other, DocEntry):
+            return NotImplemented
+        return self._astuple() == other._astuple()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        return hash(self._astuple())
+
+    def __reduce__(self):
+        return (DocEntry, self._astuple())
+
+    def __repr__(self):
+        return "%s(docs=%r, version=%r, deprecated_version=%r, " \
+            "deprecated=%r)" % ((type(self).__name__,) + self._astuple())
+
+
+# shared by all entries without content, never change it
+_EMPTY_DOC_ENTRY = DocEntry("", "", "", "")
+
+
+def _new_doc_entry(docs, version, deprecated_version, deprecated):
+    # about a third of all entries have no content at all, share them
+    if not (docs or version or deprecated_version or deprecated):
+        return _EMPTY_DOC_ENTRY
+    return DocEntry(docs, version, deprecated_version, deprecated)
+
+
+class _section_property(util.cached_property):
+    """A cached_property which is stored as its own section in the cache
+    and, if the namespace was loaded from the cache, only read from it on
+    first access.
+    """
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        entry = obj._cache_entry
+        if entry is not None and self.__name__ in entry:
+            result = self.load(entry, self.__name__)
+        else:
+            result = self.fget(obj)
+        obj.__dict__[self.__name__] = result
+        return result
+
+    def dump(self, value):
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, entry, name):
+        return pickle.loads(entry.read(name))
+
+
+class _symbols_property(_section_property):
+    """A _section_property for a mapping of strings to lists of strings,
+    stored as a symbols.SymbolTable and used directly from the cache
+    without unpickling.
+    """
+
+    def dump(self, value):
+        return dump_symbol_table(value)
+
+    def load(self, entry, name):
+        return SymbolTable(*entry.map(name))
 
 
 class Namespace(object):
 
-    def __init__(self, namespace, version):
+    def __init__(self, namespace, version, _cache_entry=None):
         self.namespace = namespace
         self.version = version
+        self._cache_entry = _cache_entry
 
         self._types = None
         self._type_structs = None
@@ -155,18 +551,15 @@ class Namespace(object):
     def _ensure_types(self):
         if self._types is not None:
             return
-        dom = _get_dom(self.path)
+        gir = _get_gir(self.path)
         self._types, self._type_structs, self._shadow_map, self._iparams = \
-            _parse_types(dom, self.import_module(), self.namespace)
+            _parse_types(gir, self.import_module(), self.namespace)
 
-    @util.cached_property
+    @_section_property
     def shared_libraries(self):
-        dom = _get_dom(self.path)
-        namespace_elm = dom.getElementsByTagName("namespace")[0]
-        shared_library = namespace_elm.getAttribute("shared-library")
-        return shared_library.split(",") if shared_library else []
+        return list(_get_gir(self.path).shared_libraries)
 
-    @util.cached_property
+    @_section_property
     def shadow_map(self):
         self._ensure_types()
         return self._shadow_map
@@ -191,26 +584,24 @@ class Namespace(object):
 
         return module
 
-    @util.cached_property
+    @_section_property
     def private(self):
-        return _parse_private(_get_dom(self.path), self.namespace)
+        return set(_get_gir(self.path).private)
 
-    @util.cached_property
+    @_section_property
     def override_docs(self):
         return parse_override_docs(self.namespace, self.version)
 
-    @util.cached_property
+    @_section_property
     def docs(self):
-        docs = _parse_docs(_get_dom(self.path))
-        _fixup_all_added_since(docs)
-        return docs
+        return _get_gir(self.path).docs
 
-    @util.cached_property
+    @_symbols_property
     def types(self):
         self._ensure_types()
         return self._types
 
-    @util.cached_property
+    @_section_property
     def type_structs(self):
         """A mapping of C type struct IDs to Python type IDs.
 
@@ -220,12 +611,26 @@ class Namespace(object):
         self._ensure_types()
         return self._type_structs
 
-    @util.cached_property
+    @_section_property
     def instance_params(self):
 
         self._ensure_types()
         return self._iparams
 
+    @_section_property
+    def symbols_digest(self):
+        """A hash of all tables used for resolving references. Changes if
+        a symbol gets added, removed or renamed, but not for documentation
+        changes.
+        """
+
+        h = hashlib.sha256()
+        for table in [self.types, self.shadow_map, self.type_structs,
+                      self.instance_params]:
+            h.update(pickle.dumps(
+                sorted(table.items()), protocol=pickle.HIGHEST_PROTOCOL))
+        return h.hexdigest()
+
     @util.cached_property
     def path(self):
         """The absolute path to the gir file.
@@ -242,22 +647,8 @@ class Namespace(object):
         of this namespace.
         """
 
-        dom = _get_dom(self.path)
-
-        # dependencies
-        deps = []
-        for include in dom.getElementsByTagName("include"):
-            name = include.getAttribute("name")
-            version = include.getAttribute("version")
-            deps.append((name, version))
-
-        # these are not always included, but we need them
-        # for base types
-        if not deps:
-            if self.namespace not in ("GObject", "GLib"):
-                deps.append(("GObject", "2.0"))
-
-        return deps
+        return get_dependency_graph().get_dependencies(
+            (self.namespace, self.version))
 
     @util.cached_property
     def all_dependencies(self):
@@ -265,17 +656,8 @@ class Namespace(object):
         dependencies of this namespace.
         """
 
-        loaded = []
-        to_load = list(self.dependencies)
-        while to_load:
-            key = to_load.pop()
-            if key in loaded:
-                continue
-            sub_ns = get_namespace(*key)
-            loaded.append(key)
-            to_load.extend(sub_ns.dependencies)
-
-        return loaded
+        return get_dependency_graph().get_all_dependencies(
+            (self.namespace, self.version))
 
     def __repr__(self):
         return "%s(%s, %s)" % (
@@ -334,185 +716,261 @@ def get_base_types():
     }
 
 
-def _parse_types(dom, module, namespace):
-    """Create a mapping of various C names to python names"""
+class _TypesCollector(object):
+    """Collects the mapping of C names to Python names which doesn't depend
+    on the Python module.
+    """
 
-    type_structs = {}
-    types = collections.defaultdict(set)
-    shadow_map = {}
-    instance_params = {}
+    def __init__(self):
+        self.type_structs = {}
+        self.types = collections.defaultdict(set)
+        self.instance_params = {}
+
+        # key is the shadowed function name (gir name)
+        self._all_shadows = {}
+        self._all_shadowed_by = {}
 
-    def add(c_name, py_name):
+        # c symbols we want to skip, but we need them for shadowed func, so
+        # remove them later
+        self.skipped = set()
+
+    def _add(self, c_name, py_name):
         assert py_name.count(".") and c_name, (c_name, py_name)
         # escape each potential attribute
         py_name = ".".join(
             map(util.escape_parameter, py_name.split(".")))
-        types[c_name].add(py_name)
+        self.types[c_name].add(py_name)
         return py_name
 
-    # key is the shadowed function name (gir name)
-    all_shadows = {}
-    all_shadowed_by = {}
-
-    # c symbols we want to skip, but we need them for shadowed func, so remove
-    # them later
-    skipped = set()
-
-    # gtk_main -> Gtk.main
-    # gtk_dialog_get_response_for_widget ->
-    #     Gtk.Dialog.get_response_for_widget
-    elements = dom.getElementsByTagName("function")
-    elements += dom.getElementsByTagName("constructor")
-    elements += dom.getElementsByTagName("method")
-    for t in elements:
-        shadows = t.getAttribute("shadows")
-        shadowed_by = t.getAttribute("shadowed-by")
-        introspectable = bool(int(t.getAttribute("introspectable") or "1"))
-        local_name = t.getAttribute("name")
-        c_name = t.getAttribute("c:identifier")
+    def handle(self, t):
+        tag = t.tag
+        if tag in ("function", "constructor", "method"):
+            self._handle_function(t)
+        elif tag == "member":
+            self._handle_member(t)
+        elif tag in ("class", "interface", "enumeration", "bitfield",
+                     "callback", "union"):
+            self._handle_type(t)
+        elif tag == "record":
+            self._handle_record(t)
+        elif tag == "constant":
+            self._handle_constant(t)
+
+    def _handle_function(self, t):
+        # gtk_main -> Gtk.main
+        # gtk_dialog_get_response_for_widget ->
+        #     Gtk.Dialog.get_response_for_widget
+
+        shadows = t.get("shadows")
+        shadowed_by = t.get("shadowed-by")
+        introspectable = bool(int(t.get("introspectable") or "1"))
+        local_name = t.get("name")
+        c_name = t.get("c:identifier")
         assert c_name
 
-        ip = t.getElementsByTagName("instance-parameter")
-        instance_param = ip[0].getAttribute("name") if ip else ""
+        instance_param = t.instance_param or ""
 
         # Copy escaping from gi: Foo.break -> Foo.break_
         full_name = local_name
-        parent = t.parentNode
+        parent = t.parent
 
         # glib:boxed toplevel in Farstream-0.1
-        if not parent.getAttribute("name"):
-            continue
+        if not parent.get("name"):
+            return
 
-        while parent.getAttribute("name"):
-            full_name = parent.getAttribute("name") + "." + full_name
-            parent = parent.parentNode
+        while parent.get("name"):
+            full_name = parent.get("name") + "." + full_name
+            parent = parent.parent
 
         if shadows:
             parent_name = full_name.rsplit(".", 1)[0]
-            all_shadows[parent_name + "." + shadows] = c_name
+            self._all_shadows[parent_name + "." + shadows] = c_name
         if shadowed_by:
             # in case something shadows itself just ignore it
             if shadowed_by != local_name:
-                all_shadowed_by[full_name] = c_name
+                self._all_shadowed_by[full_name] = c_name
 
         if not introspectable or shadowed_by:
-            skipped.add(c_name)
+            self.skipped.add(c_name)
 
-        set_name = add(c_name, full_name)
+        set_name = self._add(c_name, full_name)
         if instance_param:
             # TODO: shadowed..?
-            instance_params[set_name] = instance_param
-
-    for key, value in all_shadows.items():
-        shadow_map[all_shadowed_by.pop(key)] = value
-    assert not all_shadowed_by, all_shadowed_by
-    del all_shadowed_by
-    del all_shadows
+            self.instance_params[set_name] = instance_param
 
-    # enums etc. GTK_SOME_FLAG_FOO -> Gtk.SomeFlag.FOO
-    for t in dom.getElementsByTagName("member"):
-        c_name = t.getAttribute("c:identifier")
+    def _handle_member(self, t):
+        # enums etc. GTK_SOME_FLAG_FOO -> Gtk.SomeFlag.FOO
+        c_name = t.get("c:identifier")
         assert c_name
         # only match constants
         if c_name != c_name.upper() or "_" not in c_name:
-            continue
-        class_name = t.parentNode.getAttribute("name")
-        field_name = t.getAttribute("name").upper()
-        local_name = namespace + "." + class_name + "." + field_name
-        add(c_name, local_name)
-
-    # classes
-    elements = dom.getElementsByTagName("class")
-    elements += dom.getElementsByTagName("interface")
-    elements += dom.getElementsByTagName("enumeration")
-    elements += dom.getElementsByTagName("bitfield")
-    elements += dom.getElementsByTagName("callback")
-    elements += dom.getElementsByTagName("union")
-    for t in elements:
-        # only top level
-        if t.parentNode.tagName != "namespace":
-            continue
-
-        c_name = t.getAttribute("c:type")
-        c_name = c_name or t.getAttribute("glib:type-name")
-        introspectable = bool(int(t.getAttribute("introspectable") or "1"))
+            return
+        class_name = t.parent.get("name")
+        field_name = t.get("name").upper()
+        local_name = _get_namespace_name(t) + "." + class_name + "." + \
+            field_name
+        self._add(c_name, local_name)
+
+    def _handle_type(self, t):
+        # classes, only top level
+        if t.parent.tag != "namespace":
+            return
+
+        c_name = t.get("c:type")
+        c_name = c_name or t.get("glib:type-name")
+        introspectable = bool(int(t.get("introspectable") or "1"))
 
         # e.g. GObject _Value__data__union
         if not c_name:
-            continue
+            return
 
         if not introspectable:
-            skipped.add(c_name)
-            continue
+            self.skipped.add(c_name)
+            return
 
-        type_name = t.getAttribute("name")
-        add(c_name, namespace + "." + type_name)
+        type_name = t.get("name")
+        self._add(c_name, _get_namespace_name(t) + "." + type_name)
 
-    # cairo_t -> cairo.Context
-    for t in dom.getElementsByTagName("record"):
-        c_name = t.getAttribute("c:type")
+    def _handle_record(self, t):
+        # cairo_t -> cairo.Context
+        c_name = t.get("c:type")
         # Gee-0.8 HazardPointer
         if not c_name:
-            continue
+            return
 
-        introspectable = bool(int(t.getAttribute("introspectable") or "1"))
+        introspectable = bool(int(t.get("introspectable") or "1"))
         if not introspectable:
-            skipped.add(c_name)
-            continue
+            self.skipped.add(c_name)
+            return
 
-        type_for = t.getAttribute("glib:is-gtype-struct-for")
+        namespace = _get_namespace_name(t)
+        type_for = t.get("glib:is-gtype-struct-for")
         if type_for:
-            type_structs[c_name] = namespace + "." + type_for
+            self.type_structs[c_name] = namespace + "." + type_for
 
-        type_name = t.getAttribute("name")
+        type_name = t.get("name")
         if type_name.startswith("_"):
-            continue
-        add(c_name, namespace + "." + type_name)
-
-    # G_TIME_SPAN_MINUTE -> GLib.TIME_SPAN_MINUTE
-    for t in dom.getElementsByTagName("constant"):
-        c_name = t.getAttribute("c:type")
-        c_name = c_name or t.getAttribute("c:identifier")
-        if t.parentNode.tagName == "namespace" and c_name:
-            name = namespace + "." + t.getAttribute("name")
-            add(c_name, name)
-
-    # make c defs which are replaced point to the key of the replacement
-    # so that: "gdk_threads_add_timeout_full" -> Gdk.threads_add_timeout
-    for shadowed, shadowing in shadow_map.items():
-        types[shadowing] = set(types[shadowed])
-        types[shadowed].clear()
+            return
+        self._add(c_name, namespace + "." + type_name)
 
-    # We wont have a Python function for these, so don't expose them
-    for c_name in skipped:
+    def _handle_constant(self, t):
+        # G_TIME_SPAN_MINUTE -> GLib.TIME_SPAN_MINUTE
+        c_name = t.get("c:type")
+        c_name = c_name or t.get("c:identifier")
+        if t.parent.tag == "namespace" and c_name:
+            name = t.parent.get("name") + "." + t.get("name")
+            self._add(c_name, name)
+
+    def finish(self):
+        shadow_map = {}
+        for key, value in self._all_shadows.items():
+            shadow_map[self._all_shadowed_by.pop(key)] = value
+        assert not self._all_shadowed_by, self._all_shadowed_by
+
+        # make c defs which are replaced point to the key of the replacement
+        # so that: "gdk_threads_add_timeout_full" -> Gdk.threads_add_timeout
+        types = self.types
+        for shadowed, shadowing in shadow_map.items():
+            types[shadowing] = set(types[shadowed])
+            types[shadowed].clear()
+
+        return (dict(types), self.type_structs, shadow_map,
+                self.instance_params, self.skipped)
+
+
+def _get_namespace_name(elm):
+    """The name of the namespace the element is contained in"""
 
-        def is_available(mod, name):
-            path, final = name.rsplit(".", 1)
-            m = mod
+    while elm.tag != "namespace":
+        elm = elm.parent
+    return elm.get("name")
+
+
+class _AttributeIndex(object):
+    """Answers if a Python ID is available in a module.
+
+    Module level names come from the introspection data and the overrides,
+    so unlike dir() nothing gets created for names which aren't there.
+    Names found get confirmed with getattr(). Objects on the way to a class
+    attribute are only looked up once.
+    """
+
+    def __init__(self, module):
+        self._module = module
+        self._names = None
+        self._objects = {}
+
+    def get_names(self):
+        """A set of all module level names"""
+
+        if self._names is None:
+            module = self._module
+            names = set(dir(type(module)))
+            names.update(module.__dict__)
+            im = getattr(module, "_introspection_module", module)
+            names.update(im.__dict__)
+            wrapper = getattr(im, "_wrapper", None)
+            if wrapper is not None:
+                # pgi: dir() would create all attributes
+                for name in wrapper.iternames():
+                    names.add(util.escape_identifier(name))
+            else:
+                names.update(dir(im))
+            self._names = names
+        return self._names
+
+    def _get_object(self, path):
+        if path not in self._objects:
+            obj = self._module
             for attr in path.split(".")[1:]:
                 try:
-                    m = getattr(m, attr)
+                    obj = getattr(obj, attr)
                 except AttributeError:
-                    return False
-            if not inspect.isclass(m):
-                return hasattr(m, final)
-            try:
-                return util.is_attribute_owner(m, final)
-            except AttributeError:
+                    obj = None
+                    break
+            self._objects[path] = obj
+        return self._objects[path]
+
+    def is_available(self, name):
+        path, final = name.rsplit(".", 1)
+        if "." not in path:
+            if final not in self.get_names():
                 return False
+            return hasattr(self._module, final)
+        obj = self._get_object(path)
+        if obj is None:
+            return False
+        if not inspect.isclass(obj):
+            return hasattr(obj, final)
+        try:
+            return util.is_attribute_owner(obj, final)
+        except AttributeError:
+            return False
 
+
+def _parse_types(gir, module, namespace):
+    """Create a mapping of various C names to python names"""
+
+    raw_types, type_structs, shadow_map, instance_params, skipped = \
+        gir.raw_types
+
+    types = collections.defaultdict(set)
+    for key, values in raw_types.items():
+        types[key] = set(values)
+
+    index = _AttributeIndex(module)
+
+    # We wont have a Python function for these, so don't expose them
+    for c_name in skipped:
         # shadowed get cleared above so this should be non-introspectable.
         # but overrides might make them available using other API, so check
         # for that before deciding that it isn't available to Python
-        types[c_name] = set(
-            filter(lambda n: is_available(module, n), types[c_name]))
+        types[c_name] = set(filter(index.is_available, types[c_name]))
 
     if namespace == "GObject":
         # these come from overrides and aren't in the gir
         # e.g. G_TYPE_INT -> GObject.TYPE_INT
-        from gi.repository import GObject
-
-        for key in dir(GObject):
+        for key in index.get_names():
             if key.startswith("TYPE_"):
                 types["G_" + key].add("GObject." + key)
             elif key.startswith(("G_MAX", "G_MIN")):
@@ -521,11 +979,9 @@ def _parse_types(dom, module, namespace):
         types["GBoxed"] = set(["GObject.GBoxed"])
         types["GType"] = set(["GObject.GType"])
     elif namespace == "GLib":
-        from gi.repository import GLib
-
         types.update(get_base_types())
 
-        for k in dir(GLib):
+        for k in index.get_names():
             if re.match("MINU?INT\\d+", k) or re.match("MAXU?INT\\d+", k):
                 types["G_" + k].add("GLib." + k)
 
@@ -542,221 +998,206 @@ def _parse_types(dom, module, namespace):
         values = sorted(values, key=lambda v: -v.count("."))
         types[key] = values
 
-    return types, type_structs, shadow_map, instance_params
+    return (types, dict(type_structs), dict(shadow_map),
+            dict(instance_params))
 
 
-def _parse_private(dom, namespace):
-    private = set()
-
-    def is_empty(node):
-        for child in record.childNodes:
-            if child.nodeType == child.TEXT_NODE:
-                continue
-            if child.tagName == "source-position":
-                continue
-            return False
-        return True
-
+def _handle_private(private, record):
     # if disguised and no record content... not perfect, but
     # we have no other way
-    for record in dom.getElementsByTagName("record"):
-        is_gtype_struct = bool(record.getAttribute("glib:is-gtype-struct-for"))
-        is_private = record.getAttribute("name").endswith("Private")
-        if is_private and not is_gtype_struct and is_empty(record):
-            name = namespace + "." + record.getAttribute("name")
-            private.add(name)
-
-    return private
-
-
-def _parse_docs(dom):
-    """Parse docs"""
-
-    all_ = {}
-    all_shadowed = {}
-    parameters = {}
-    sparas = {}
-    returns = {}
-    sreturns = {}
-    signals = {}
-    properties = {}
-    fields = {}
-
-    all_docs = {
-        "all": all_,
-        "all_shadowed": all_shadowed,
-        "parameters": parameters,
-        "signal-parameters": sparas,
-        "returns": returns,
-        "signal-returns": sreturns,
-        "signals": signals,
-        "properties": properties,
-        "fields": fields,
-    }
+    is_gtype_struct = bool(record.get("glib:is-gtype-struct-for"))
+    is_private = record.get("name").endswith("Private")
+    if is_private and not is_gtype_struct and record.is_empty:
+        name = _get_namespace_name(record) + "." + record.get("name")
+        private.add(name)
+
+
+def _get_doc_name(elm):
+    """Returns a string (maybe be empty) or None"""
+
+    # if this entry shadows another one use its name
+    shadows = elm.get("shadows")
+    if shadows:
+        n = shadows
+    else:
+        if elm.has("name"):
+            n = elm.get("name")
+        elif elm.has("glib:name"):
+            n = elm.get("glib:name")
+        else:
+            return
 
-    tag_names = [
-        [("glib:signal",), signals],
-        [("field",), fields],
-        [("property",), properties],
-        [("parameter", "glib:signal"), sparas],
-        [("parameter", "function-macro"), parameters],
-        [("parameter", "function"), parameters],
-        [("parameter", "method"), parameters],
-        [("parameter", "callback"), parameters],
-        [("parameter", "constructor"), parameters],
-        [("parameter", "function-inline"), parameters],
-        [("parameter", "method-inline"), parameters],
-        [("instance-parameter", "method"), parameters],
-        [("instance-parameter", "method-inline"), parameters],
-        [("instance-parameter", "function"), parameters],
-        [("return-value", "callback"), returns],
-        [("return-value", "method"), returns],
-        [("return-value", "function"), returns],
-        [("return-value", "constructor"), returns],
-        [("return-value", "function-inline"), returns],
-        [("return-value", "method-inline"), returns],
-        [("return-value", "glib:signal"), sreturns],
-        [("interface",), all_],
-        [("method",), all_],
-        [("function",), all_],
-        [("constant",), all_],
-        [("record",), all_],
-        [("enumeration",), all_],
-        [("member",), all_],
-        [("callback",), all_],
-        [("alias",), all_],
-        [("constructor",), all_],
-        [("class",), all_],
-        [("bitfield",), all_],
+    if elm.tag == "virtual-method":
+        # pgi/pygobject escape before prefixing
+        n = "do_" + util.escape_identifier(n)
+    elif elm.tag == "member":
+        # enum/flag values
+        n = n.upper()
+
+    return n
+
+
+class _DocsCollector(object):
+    """Collects the docs of all gir elements"""
+
+    _tag_names = [
+        [("glib:signal",), "signals"],
+        [("field",), "fields"],
+        [("property",), "properties"],
+        [("parameter", "glib:signal"), "signal-parameters"],
+        [("parameter", "function-macro"), "parameters"],
+        [("parameter", "function"), "parameters"],
+        [("parameter", "method"), "parameters"],
+        [("parameter", "callback"), "parameters"],
+        [("parameter", "constructor"), "parameters"],
+        [("parameter", "function-inline"), "parameters"],
+        [("parameter", "method-inline"), "parameters"],
+        [("instance-parameter", "method"), "parameters"],
+        [("instance-parameter", "method-inline"), "parameters"],
+        [("instance-parameter", "function"), "parameters"],
+        [("return-value", "callback"), "returns"],
+        [("return-value", "method"), "returns"],
+        [("return-value", "function"), "returns"],
+        [("return-value", "constructor"), "returns"],
+        [("return-value", "function-inline"), "returns"],
+        [("return-value", "method-inline"), "returns"],
+        [("return-value", "glib:signal"), "signal-returns"],
+        [("interface",), "all"],
+        [("method",), "all"],
+        [("function",), "all"],
+        [("constant",), "all"],
+        [("record",), "all"],
+        [("enumeration",), "all"],
+        [("member",), "all"],
+        [("callback",), "all"],
+        [("alias",), "all"],
+        [("constructor",), "all"],
+        [("class",), "all"],
+        [("bitfield",), "all"],
         # vfuncs last, since they replace normal onces in case of name clashes
-        [("virtual-method",), all_],
-        [("parameter", "virtual-method"), parameters],
-        [("instance-parameter", "virtual-method"), parameters],
-        [("return-value", "virtual-method"), returns],
+        [("virtual-method",), "all"],
+        [("parameter", "virtual-method"), "parameters"],
+        [("instance-parameter", "virtual-method"), "parameters"],
+        [("return-value", "virtual-method"), "returns"],
     ]
 
-    def get_child_by_tag(node, tag_name):
-        for sub in node.childNodes:
-            try:
-                if sub.tagName == tag_name:
-                    return sub
-            except AttributeError:
-                continue
+    def __init__(self):
+        names = ["all", "all_shadowed", "parameters", "signal-parameters",
+                 "returns", "signal-returns", "signals", "properties",
+                 "fields"]
+        self.all_docs = dict((n, {}) for n in names)
+        # vfunc docs get applied at the end, so they replace normal ones
+        self._vfunc_docs = dict((n, {}) for n in names)
+
+        # tag -> [(needed parent tags, result name, is vfunc)], so each
+        # element only gets matched against the entries for its tag
+        self._routes = {}
+        for target, result_name in self._tag_names:
+            is_vfunc = "virtual-method" in target
+            self._routes.setdefault(target[0], []).append(
+                (target[1:], result_name, is_vfunc))
+
+        self._path_seen = set()
+        self._path_done = set()
+
+    def _get_context(self, elm):
+        """Returns a (names, tags, shadowed) tuple for the path from the
+        namespace down to `elm`, with the names already escaped. The result
+        gets cached on the element, so the ancestors are only looked at once.
+        """
 
-    path_seen = set()
-    path_done = set()
+        context = elm.doc_context
+        if context is not None:
+            return context
+
+        tag = elm.tag
+        if tag == "namespace":
+            name = _get_doc_name(elm)
+            names = (util.escape_parameter(name),) if name is not None else ()
+            context = (names, (), False)
+        elif tag == "repository":
+            # Tracker-0.16 includes <constant> outside of <namespace>
+            context = ((), (), False)
+        else:
+            names, tags, shadowed = self._get_context(elm.parent)
+            name = _get_doc_name(elm)
+            if name is not None:
+                names = names + (util.escape_parameter(name),)
+            # this gets shadowed by another entry, bail out
+            shadowed = shadowed or bool(elm.get("shadowed-by"))
+            context = (names, (tag,) + tags, shadowed)
 
-    all_elements = dom.getElementsByTagName("*")
+        elm.doc_context = context
+        return context
 
-    def get_elements(name):
-        for elm in all_elements:
-            if elm.tagName == name:
-                yield elm
+    def handle(self, e):
+        routes = self._routes.get(e.tag)
+        if routes is None:
+            return
 
-    for target, result in tag_names:
-        tag = target[0]
-        needed = target[1:]
+        # these can be nested, so if there is not name, don't go up the tree
+        # or we might up ending up with the same name as the parent record
+        if e.tag == "record" and _get_doc_name(e) is None:
+            return
 
-        for e in get_elements(tag):
-            doc_elm = get_child_by_tag(e, "doc")
-            docs = (doc_elm and doc_elm.firstChild.nodeValue) or ""
-            version = e.getAttribute("version")
+        l, tags, shadowed = self._get_context(e)
 
-            # old gir had the deprecation text in the attribute, new
-            # gir in the <doc-deprecated> tag
-            deprecated = e.getAttribute("deprecated")
-            if deprecated in "01":
-                deprecated = ""
+        docs = e.doc or ""
+        version = e.get("version")
 
-            dep_elm = get_child_by_tag(e, "doc-deprecated")
-            dep_elm_string = (dep_elm and dep_elm.firstChild.nodeValue) or ""
-            deprecated = dep_elm_string or deprecated
+        # old gir had the deprecation text in the attribute, new
+        # gir in the <doc-deprecated> tag
+        deprecated = e.get("deprecated")
+        if deprecated in "01":
+            deprecated = ""
 
-            deprecated_version = e.getAttribute("deprecated-version")
+        dep_elm_string = e.doc_deprecated or ""
+        deprecated = dep_elm_string or deprecated
 
-            def get_name(elm):
-                """Returns a string (maybe be empty) or None"""
+        deprecated_version = e.get("deprecated-version")
 
-                # if this entry shadows another one use its name
-                shadows = elm.getAttribute("shadows")
-                if shadows:
-                    n = shadows
-                else:
-                    if elm.hasAttribute("name"):
-                        n = elm.getAttribute("name")
-                    elif elm.hasAttribute("glib:name"):
-                        n = elm.getAttribute("glib:name")
-                    else:
-                        return
-
-                if elm.tagName == "virtual-method":
-                    # pgi/pygobject escape before prefixing
-                    n = "do_" + util.escape_identifier(n)
-                elif elm.tagName == "member":
-                    # enum/flag values
-                    n = n.upper()
-
-                return n
-
-            # these can be nested, so if there is not name, don't go up the tree
-            # or we might up ending up with the same name as the parent record
-            requires_name = ["record"]
-
-            l = []
-            tags = []
-            current = e
-            name = get_name(current)
-            if name is not None:
-                l.append(name)
-            elif current.tagName in requires_name:
-                continue
-            shadowed = False
-            while current.tagName != "namespace":
-                # this gets shadowed by another entry, bail out
-                if current.getAttribute("shadowed-by"):
-                    shadowed = True
-                tags.append(current.tagName)
-                current = current.parentNode
-                # Tracker-0.16 includes <constant> outside of <namespace>
-                if current.tagName == "repository":
-                    break
-                name = get_name(current)
-                if name is not None:
-                    l.insert(0, name)
+        key = ".".join(l)
+        new = _new_doc_entry(
+            docs, version, deprecated_version, deprecated)
 
+        for needed, result_name, is_vfunc in routes:
             # for shadowed function docs we save docs anyway since we
             # can include them in the function docs for the replacement.
             # This can be helpful since some replacements just reference
             # the shadowed function, which we don't include.
-            if result is all_shadowed:
-                result = all_
             if shadowed:
-                if result is all_:
-                    result = all_shadowed
+                if result_name == "all":
+                    result_name = "all_shadowed"
                 else:
                     continue
 
-            path_seen.add(tuple(tags))
+            self._path_seen.add(tags)
 
             if any(a for a in needed if a not in tags):
                 continue
 
-            path_done.add(tuple(tags))
-
-            key = ".".join(map(util.escape_parameter, l))
+            self._path_done.add(tags)
 
-            if tag in ("method", "constructor"):
+            if e.tag in ("method", "constructor"):
                 assert len(l) > 2
 
-            new = DocEntry(docs, version, deprecated_version, deprecated)
             # Atspi-2.0 has some things declared twice, so
             # don't be too strict here.
 
             # We prefix vfuncs with "do_", but this could still clash here
-            if "virtual-method" not in target:
+            if not is_vfunc:
+                result = self.all_docs[result_name]
                 assert key not in result or new == result[key], key
+            else:
+                result = self._vfunc_docs[result_name]
             result[key] = new
 
-    assert not (path_seen - path_done), path_seen - path_done
+    def finish(self):
+        path_seen = self._path_seen
+        path_done = self._path_done
+        assert not (path_seen - path_done), path_seen - path_done
+
+        for name, result in self._vfunc_docs.items():
+            self.all_docs[name].update(result)
 
-    return all_docs
+        return self.all_docs
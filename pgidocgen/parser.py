@@ -7,34 +7,75 @@
 # version 2.1 of the License, or (at your option) any later version.
 
 import re
+import sys
+import multiprocessing
 
 from lxml import etree
 from xml.sax.saxutils import escape
-from bs4 import BeautifulSoup, Tag
 
-from . import util
+from . import util, namespace
 from .util import escape_rest, force_unindent
 from .gtkdoc import ConvertMarkDown
 from .docbook_escape import docbook_escape
 
 
-_scanner = re.Scanner([
-    (r"\*?@[A-Za-z0-9_]+", lambda scanner, token: ("PARAM", token)),
-    (r"[#%]?[A-Za-z0-9_:\-]+\.[A-Za-z0-9_:\-]+\(\)", lambda scanner, token: ("VFUNC", token)),
-    (r"[#%]?[A-Za-z0-9_:\-]+\.[A-Za-z0-9_:\-]+", lambda scanner, token: ("FIELD", token)),
-    (r"[#%]?[A-Za-z_]+[A-Za-z0-9_]*::[A-Za-z\-]+[A-Za-z0-9\-_]*", lambda scanner, token: ("FULLSIG", token)),
-    (r"::[A-Za-z\-]+[A-Za-z0-9\-_]*", lambda scanner, token: ("SIG", token)),
-    (r"[#%]?[A-Za-z_]+[A-Za-z0-9_]*:[A-Za-z\-]+[A-Za-z0-9\-_]*", lambda scanner, token: ("FULLPROP", token)),
-    (r":[A-Za-z\-]+[A-Za-z0-9\-_]*", lambda scanner, token: ("PROP", token)),
-    (r"[#%]?[A-Za-z0-9_]+\**", lambda scanner, token: ("ID", token)),
-    (r"\s+", lambda scanner, token: ("SPACE", token)),
-    (r".", lambda scanner, token: ("OTHER", token)),
-])
+# "." comes last and with DOTALL matches anything, so the tokens always
+# cover the whole text
+_TOKEN = re.compile("|".join("(?P<%s>%s)" % t for t in [
+    ("PARAM", r"\*?@[A-Za-z0-9_]+"),
+    ("VFUNC", r"[#%]?[A-Za-z0-9_:\-]+\.[A-Za-z0-9_:\-]+\(\)"),
+    ("FIELD", r"[#%]?[A-Za-z0-9_:\-]+\.[A-Za-z0-9_:\-]+"),
+    ("FULLSIG", r"[#%]?[A-Za-z_]+[A-Za-z0-9_]*::[A-Za-z\-]+[A-Za-z0-9\-_]*"),
+    ("SIG", r"::[A-Za-z\-]+[A-Za-z0-9\-_]*"),
+    ("FULLPROP", r"[#%]?[A-Za-z_]+[A-Za-z0-9_]*:[A-Za-z\-]+[A-Za-z0-9\-_]*"),
+    ("PROP", r":[A-Za-z\-]+[A-Za-z0-9\-_]*"),
+    ("ID", r"[#%]?[A-Za-z0-9_]+\**"),
+    ("SPACE", r"\s+"),
+    ("OTHER", r"."),
+]), re.DOTALL)
 
 
-def _handle_data(repo, current_type, current_func, d):
-    results, remainder = _scanner.scan(d)
-    assert not remainder, repr(remainder)
+# the characters escape_rest() escapes
+_REST_SPECIAL = frozenset("\\*_:`@")
+
+
+def _tokenize(d):
+    """Returns a list of (type, token) tuples covering all of `d`"""
+
+    return [(m.lastgroup, m.group()) for m in _TOKEN.finditer(d)]
+
+
+# all words which could be looked up as C identifiers
+_ID_CANDIDATE = re.compile(r"[A-Za-z0-9_]+")
+
+
+def _lookup_py_ids(repo, texts):
+    """Looks up all words of `texts` which could be C identifiers at once.
+    Returns a dict mapping them to Python identifiers or None.
+    """
+
+    ids = set()
+    for text in texts:
+        ids.update(_ID_CANDIDATE.findall(text))
+    return repo.lookup_py_ids(ids)
+
+
+def _handle_data(repo, current_type, current_func, d, py_ids=None):
+    """`py_ids` is the result of _lookup_py_ids() for the whole docstring.
+    Identifiers not included get looked up one by one.
+    """
+
+    results = _tokenize(d)
+
+    if py_ids is None:
+        py_ids = repo.lookup_py_ids(set(
+            [token.rstrip("*").lstrip("#%") for type_, token in results
+             if type_ == "ID"]))
+
+    def lookup_py_id(c_id):
+        if c_id in py_ids:
+            return py_ids[c_id]
+        return repo.lookup_py_id(c_id)
 
     def id_ref(token):
         # possible identifier reference
@@ -45,7 +86,7 @@ def _handle_data(repo, current_type, current_func, d):
         if sub.startswith(("#", "%")):
             sub = sub[1:]
 
-        pytype = repo.lookup_py_id(sub)
+        pytype = lookup_py_id(sub)
 
         if pytype is not None:
             return ":obj:`%s`" % pytype
@@ -54,14 +95,14 @@ def _handle_data(repo, current_type, current_func, d):
                 # if we are sure it's a reference and it ends with 's'
                 # like "a list of #GtkWindows", we also try "#GtkWindow"
                 sub = token[1:-1]
-                pytype = repo.lookup_py_id(sub)
+                pytype = lookup_py_id(sub)
                 if pytype is not None:
                     assert "." in pytype
                     return ":obj:`%s <%s>`" % (pytype + "s", pytype)
             else:
                 # also try to add "s", GdkFrameTiming(s)
                 sub = token[1:] + "s"
-                pytype = repo.lookup_py_id(sub)
+                pytype = lookup_py_id(sub)
                 if pytype is not None:
                     py_no_s = pytype[:-1] if pytype[-1] == "s" else pytype
                     return ":obj:`%s <%s>`" % (py_no_s, pytype)
@@ -71,6 +112,11 @@ def _handle_data(repo, current_type, current_func, d):
     out = []
     need_space_at_start = False
     for type_, token in results:
+        if type_ == "SPACE" and not need_space_at_start:
+            # whitespace never gets changed or escaped
+            out.append(token)
+            continue
+
         orig_token = token
         if type_ == "PARAM":
             token = token.lstrip("*")
@@ -95,7 +141,7 @@ def _handle_data(repo, current_type, current_func, d):
             pytype = repo.lookup_py_id_for_type_struct(class_id)
             if pytype is None:
                 # fall back to the class, for #GObject.constructed()
-                pytype = repo.lookup_py_id(class_id)
+                pytype = lookup_py_id(class_id)
             if pytype is not None:
                 token = ":obj:`%s.do_%s`\\()" % (pytype, field)
         elif type_ == "FIELD":
@@ -103,7 +149,7 @@ def _handle_data(repo, current_type, current_func, d):
             if field.startswith(("#", "%")):
                 field = field[1:]
             c_id, field_name = field.split(".", 1)
-            objtype = repo.lookup_py_id(c_id)
+            objtype = lookup_py_id(c_id)
             if objtype is not None:
                 token = ":ref:`%s.%s <%s.fields>`" % (
                     objtype, field_name, objtype)
@@ -115,7 +161,7 @@ def _handle_data(repo, current_type, current_func, d):
             if not c_id:
                 py_id = current_type
             else:
-                py_id = repo.lookup_py_id(c_id)
+                py_id = lookup_py_id(c_id)
 
             if py_id and "_" not in prop_name:
                 prop_attr = prop_name.replace("-", "_")
@@ -140,7 +186,7 @@ def _handle_data(repo, current_type, current_func, d):
             if not c_id:
                 py_id = current_type
             else:
-                py_id = repo.lookup_py_id(c_id)
+                py_id = lookup_py_id(c_id)
 
             if py_id and "_" not in sig_name and not is_type_struct:
                 sig_attr = sig_name.replace("-", "_")
@@ -173,7 +219,7 @@ def _handle_data(repo, current_type, current_func, d):
                         token = "\\" + token
                 need_space_at_start = False
 
-        if changed and token and escape_rest(token[-1]) != token[-1]:
+        if changed and token and token[-1] in _REST_SPECIAL:
             # something changed, we have to make sure that
             # the previous and next character is a space so
             # docutils doesn't get confused wit references
@@ -184,29 +230,28 @@ def _handle_data(repo, current_type, current_func, d):
     return "".join(out)
 
 
-def docref_to_pyref(repo, ref, text):
-    """Take a gtk-doc reference and try to convert it to a Python reference.
+def resolve_docref(repo, ref):
+    """Given a gtk-doc reference returns a (kind, target) tuple or None if
+    it can't be resolved. `kind` is one of
 
-    If that fails returns None.
+    * "type": `target` is the Python identifier for the C identifier
+    * "func": `target` is the Python identifier for a function or method
+    * "prop": `target` is the Python identifier for a property
+    * "url": `target` is an URL to external resources
+
+    Use Repository.lookup_docref() instead, which remembers the results.
     """
 
     # GtkEntryCompletion
     pyref = repo.lookup_py_id(ref)
     if pyref is not None:
-        # if the link text is a C type, try to convert it
-        textref = repo.lookup_py_id(text)
-        if not textref:
-            textref = escape_rest(text)
-        if textref != pyref:
-            return ":obj:`%s <%s>`" % (textref, pyref)
-        else:
-            return ":obj:`%s`" % pyref
+        return ("type", pyref)
 
     # gtk-assistant-commit -> gtk_assistant_commit -> Gtk.Assistant.commit
     func = ref.replace("-", "_")
     pyref = repo.lookup_py_id(func)
     if pyref is not None:
-        return ":obj:`%s <%s>`" % (escape_rest(text), pyref)
+        return ("func", pyref)
 
     # GtkEntryCompletion--inline-completion ->
     #   Gtk.EntryCompletion.props.inline_completion
@@ -215,30 +260,109 @@ def docref_to_pyref(repo, ref, text):
         prop = prop.replace("-", "_")
         pyref = repo.lookup_py_id(type_)
         if pyref is not None:
-            return ":obj:`%s <%s.props.%s>`" % (escape_rest(text), pyref, prop)
+            return ("prop", "%s.props.%s" % (pyref, prop))
+
+    url = repo.lookup_gtkdoc_ref(ref)
+    if url is not None:
+        return ("url", url)
 
     return None
 
 
-def _handle_xml(repo, current_type, current_func, out, item):
+def docref_to_pyref(repo, ref, text):
+    """Take a gtk-doc reference and try to convert it to a Python reference.
+
+    If that fails returns None.
+    """
+
+    resolved = repo.lookup_docref(ref)
+    if resolved is None:
+        return None
+
+    kind, pyref = resolved
+    if kind == "type":
+        # if the link text is a C type, try to convert it
+        textref = repo.lookup_py_id(text)
+        if not textref:
+            textref = escape_rest(text)
+        if textref != pyref:
+            return ":obj:`%s <%s>`" % (textref, pyref)
+        else:
+            return ":obj:`%s`" % pyref
+    elif kind == "url":
+        return None
+
+    return ":obj:`%s <%s>`" % (escape_rest(text), pyref)
+
+
+# what BeautifulSoup considers whitespace
+_ASCII_SPACES = " \n\t\x0c\r"
+
+
+def _normalize_space(text):
+    """Whitespace-only strings become a single newline if they contain
+    one and a space otherwise, like BeautifulSoup does it.
+    """
+
+    if text.strip(_ASCII_SPACES):
+        return text
+    return "\n" if "\n" in text else " "
+
+
+def _get_text(element):
+    """All text content of an element and its descendants"""
+
+    return "".join([_normalize_space(t) for t in element.itertext()])
+
+
+def _get_contents(element):
+    """Yields the text and the child elements of an element in document
+    order. Comments and processing instructions are treated as text.
+    """
+
+    if element.text:
+        yield _normalize_space(element.text)
+    for child in element:
+        if child.tag is etree.Comment:
+            yield _normalize_space(child.text) if child.text else ""
+        elif child.tag is etree.ProcessingInstruction:
+            yield "%s %s" % (child.target, child.text or "")
+        else:
+            yield child
+        if child.tail:
+            yield _normalize_space(child.tail)
+
+
+def _get_children(element):
+    """Yields all child elements, skipping comments and processing
+    instructions
+    """
+
+    for child in element:
+        if isinstance(child.tag, str):
+            yield child
+
+
+def _handle_xml(repo, current_type, current_func, out, item, py_ids=None):
 
     def handle_next(out, item):
-        return _handle_xml(repo, current_type, current_func, out, item)
+        return _handle_xml(
+            repo, current_type, current_func, out, item, py_ids)
 
     def handle_data(text):
-        return _handle_data(repo, current_type, current_func, text)
-
-    if isinstance(item, Tag):
-        item_text = item.getText().strip()
-        if item.name == "literal" or item.name == "type":
-            if item.text:
+        return _handle_data(repo, current_type, current_func, text, py_ids)
+
+    if not isinstance(item, str):
+        name = item.tag
+        text = _get_text(item)
+        item_text = text.strip()
+        if name == "literal" or name == "type":
+            if text:
                 # docutils doesn't like empty literals..
-                out.append("``%s``" % item.text)
-        elif item.name == "itemizedlist":
+                out.append("``%s``" % text)
+        elif name == "itemizedlist":
             lines = []
-            for item in item.contents:
-                if not isinstance(item, Tag):
-                    continue
+            for item in _get_children(item):
                 other_out = []
                 handle_next(other_out, item)
                 item_text = "".join(other_out).strip()
@@ -250,9 +374,9 @@ def _handle_xml(repo, current_type, current_func, out, item):
                         data += "  " + line + "\n"
                 lines.append(data.rstrip())
             out.append("\n" + "\n".join(lines) + "\n")
-        elif item.name == "ulink":
+        elif name == "ulink":
             out.append("`%s <%s>`__" % (item_text, item.get("url", "")))
-        elif item.name == "link":
+        elif name == "link":
             lines = []
             linked = item.get("linkend", "")
             if not linked:
@@ -262,14 +386,14 @@ def _handle_xml(repo, current_type, current_func, out, item):
                 if pyref is not None:
                     lines.append(pyref)
                 else:
-                    url = repo.lookup_gtkdoc_ref(linked)
-                    if url is not None:
-                        lines.append("`%s <%s>`__" % (item_text, url))
+                    resolved = repo.lookup_docref(linked)
+                    if resolved is not None:
+                        lines.append("`%s <%s>`__" % (item_text, resolved[1]))
                     else:
                         lines.append("'%s [%s]'" % (item_text, linked))
                         repo.missed_links += 1
             out.extend(lines)
-        elif item.name == "programlisting" or item.name == "screen":
+        elif name == "programlisting" or name == "screen":
             if not item_text.count("\n"):
                 out.append("``%s``" % item_text)
             else:
@@ -279,11 +403,11 @@ def _handle_xml(repo, current_type, current_func, out, item):
                     util.indent(
                         util.unindent(item_text, ignore_first_line=True)))
                 out.append(code)
-        elif item.name == "para":
-            for item in item.contents:
+        elif name == "para":
+            for item in _get_contents(item):
                 handle_next(out, item)
             out.append("\n")
-        elif item.name == "title":
+        elif name == "title":
             # fake a title by creating a "Definition List". It can contain
             # inline markup and is bold in the default theme. Only restriction
             # is it doesn't allow newlines, but we can live with that for
@@ -292,24 +416,19 @@ def _handle_xml(repo, current_type, current_func, out, item):
                 handle_data(item_text).splitlines())
             code = "\n%s\n    ..\n        .\n\n" % title_text
             out.append(code)
-        elif item.name == "keycombo":
+        elif name == "keycombo":
             subs = []
-            for sub in item.contents:
-                if not isinstance(sub, Tag):
-                    continue
-                subs.append(handle_data(sub.getText().strip()))
+            for sub in _get_children(item):
+                subs.append(handle_data(_get_text(sub).strip()))
             out.append(" + ".join(subs))
-        elif item.name == "varlistentry":
+        elif name == "varlistentry":
             terms = []
             listitem = None
-            for sub in item.contents:
-                if not isinstance(sub, Tag):
-                    continue
-
-                if sub.name == "term":
-                    terms.append(sub.getText().strip())
-                elif sub.name == "listitem":
-                    listitem = sub.getText().strip()
+            for sub in _get_children(item):
+                if sub.tag == "term":
+                    terms.append(_get_text(sub).strip())
+                elif sub.tag == "listitem":
+                    listitem = _get_text(sub).strip()
                 else:
                     assert 0
 
@@ -329,13 +448,13 @@ def _handle_xml(repo, current_type, current_func, out, item):
             out.append("\n")
             out.extend(lines)
         else:
-            for sub in item.contents:
+            for sub in _get_contents(item):
                 handle_next(out, sub)
     else:
         if not out or out[-1].endswith("\n"):
-            data = force_unindent(item.string, ignore_first_line=False)
+            data = force_unindent(item, ignore_first_line=False)
         else:
-            data = force_unindent(item.string, ignore_first_line=True)
+            data = force_unindent(item, ignore_first_line=True)
         out.append(handle_data(data))
 
 
@@ -347,7 +466,10 @@ def _docstring_to_docbook(docstring):
     Things like "#GtkWidget" will remain as is.
     """
 
-    docstring = docbook_escape(docstring)
+    return _markdown_to_docbook(docbook_escape(docstring))
+
+
+def _markdown_to_docbook(docstring):
     docstring = ConvertMarkDown("", docstring)
 
     # ConvertMarkDown doesn't handle inline markup yet... so at least convert
@@ -363,27 +485,77 @@ def _docstring_to_docbook(docstring):
     return docstring
 
 
+_RECOVER_PARSER = etree.XMLParser(recover=True)
+
+
 def _docbook_to_rest(repo, docbook, current_type, current_func):
     dummy = "<dummy>" + docbook + "</dummy>"
-    dummy = etree.tostring(
-        etree.fromstring(dummy, parser=etree.XMLParser(recover=True)))
-    soup = BeautifulSoup(dummy, "xml")
+    root = etree.fromstring(dummy, parser=_RECOVER_PARSER)
+
+    # resolve the identifiers of all text nodes in one go
+    py_ids = _lookup_py_ids(repo, root.itertext())
 
     out = []
-    for item in soup.contents:
-        _handle_xml(repo, current_type, current_func, out, item)
-
-    # make sure to insert spaces between special reST chars
-    rst = ""
-    while out:
-        c = out.pop(0)
-        if rst and c:
-            last = rst[-1]
-            first = c[0]
-            if escape_rest(last) != last and escape_rest(first) != first:
-                rst += " "
-        rst += c
+    _handle_xml(repo, current_type, current_func, out, root, py_ids)
+
+    return _join_rest(out)
+
+
+def _join_rest(fragments):
+    """Joins reST fragments, inserting a space where two special reST
+    characters would touch.
+    """
+
+    special = _REST_SPECIAL
+    parts = []
+    last = ""
+    for c in fragments:
+        if not c:
+            continue
+        if last in special and c[0] in special:
+            parts.append(" ")
+        parts.append(c)
+        last = c[-1]
+
+    return "".join(parts)
+
+
+_INLINE_CODE = re.compile(r"(\|\[.*?\]\|)", flags=re.MULTILINE | re.DOTALL)
+
+# text without anything which could make it invalid inside an XML element
+_PLAIN_TEXT = re.compile(
+    r"[^<&\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]*\Z")
+
+
+# A line of plain text: words separated by single spaces, nothing
+# markdown or docbook would treat specially and no list item or heading
+_PLAIN_LINE = r"(?![#-]|\d+\.)%(word)s(?: %(word)s)*" % {
+    "word": r"[^\s*`\[\]|<>&\\!=+~{}\x00-\x1f]+"}
+
+# paragraphs of plain lines, separated by a single empty line
+_PLAIN_DOCSTRING = re.compile(
+    r"%(line)s(?:\n\n?%(line)s)*\n?\Z" % {"line": _PLAIN_LINE})
+
+
+def is_plain_docstring(docstring):
+    """Returns True if the docstring doesn't contain any markup besides
+    references, in which case docstring_to_rest() can skip the markdown
+    and docbook conversion.
+    """
+
+    return _PLAIN_DOCSTRING.match(docstring) is not None
 
+
+def _plain_docstring_to_rest(repo, docstring, current_type, current_func):
+    # gives the same result as the full conversion, which would wrap each
+    # paragraph in a <para>
+    paragraphs = docstring.rstrip("\n").split("\n\n")
+    py_ids = _lookup_py_ids(repo, [docstring])
+    rst = "\n\n".join(
+        [_handle_data(repo, current_type, current_func, p, py_ids)
+         for p in paragraphs])
+    if docstring.endswith("\n"):
+        rst += "\n"
     return rst
 
 
@@ -413,27 +585,106 @@ def docstring_to_rest(repo, docstring, current_type=None, current_func=None):
         # functions or methods
         assert current_func.count(".") in (1, 2)
 
+    if is_plain_docstring(docstring):
+        return _plain_docstring_to_rest(
+            repo, docstring, current_type, current_func)
+
+    docstring = _escape_xml(docstring)
+    docbook = _docstring_to_docbook(docstring)
+    rst = _docbook_to_rest(repo, docbook, current_type, current_func)
+    return _strip_newlines(docstring, rst)
+
+
+def _escape_xml(docstring):
+    """Escapes the parts of the docstring which aren't valid XML, assuming
+    they are markdown. Inline code is left as is.
+    """
+
     def esc_xml(text):
+        # text without markup is always valid
+        if _PLAIN_TEXT.match(text) and "]]>" not in text:
+            return text
         # in case it's not valid xml, assume markdown and escape
         try:
-            etree.tostring(etree.fromstring(
-                "<dummy>%s</dummy>" % text.replace(
-                    "&nbsp;", "&#160;")))
+            etree.fromstring("<dummy>%s</dummy>" % text.replace(
+                "&nbsp;", "&#160;"))
         except etree.XMLSyntaxError:
             text = escape(text)
         return text
 
-    # skip inline code when escaping xml
-    reg = re.compile(r"(\|\[.*?\]\|)", flags=re.MULTILINE | re.DOTALL)
-    docstring = "".join([
-        p if reg.match(p) else esc_xml(p) for p in reg.split(docstring)])
+    return "".join([
+        p if _INLINE_CODE.match(p) else esc_xml(p)
+        for p in _INLINE_CODE.split(docstring)])
 
-    docbook = _docstring_to_docbook(docstring)
-    rst = _docbook_to_rest(repo, docbook, current_type, current_func)
 
+def _strip_newlines(docstring, rst):
+    # only keep a trailing newline if the docstring had one, and never
+    # more than one empty line at the end
     if not docstring.endswith("\n"):
         rst = rst.rstrip("\n")
     while rst.endswith("\n\n"):
         rst = rst[:-1]
-
     return rst
+
+
+_worker_repo = None
+
+
+def _init_worker(key, cache_dir):
+    global _worker_repo
+
+    from .repo import Repository
+
+    if cache_dir is not None:
+        namespace.set_cache_dir(cache_dir)
+    _worker_repo = Repository(*key)
+
+
+def _convert(repo, item):
+    missed_links = repo.missed_links
+    try:
+        rst = docstring_to_rest(repo, *item)
+        return rst, repo.missed_links - missed_links
+    finally:
+        repo.missed_links = missed_links
+
+
+def _convert_in_worker(item):
+    return _convert(_worker_repo, item)
+
+
+def docstring_to_rest_many(repo, items, jobs=None):
+    """Converts many docstrings to reST using a pool of processes.
+
+    Args:
+        repo (Repository): the repo that produced the docstrings. Each
+            worker creates its own Repository for the same namespace.
+        items (list): (docstring, current_type, current_func) tuples, see
+            docstring_to_rest() for their meaning
+        jobs (int or None): the number of processes, defaults to the number
+            of CPUs
+
+    Returns:
+        list: a (rst, missed_links) tuple for each item, in the same order.
+            `missed_links` is the number of links which couldn't be
+            resolved. Unlike docstring_to_rest() this doesn't change
+            repo.missed_links.
+    """
+
+    items = list(items)
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+
+    if jobs <= 1 or len(items) < 2:
+        return [_convert(repo, item) for item in items]
+
+    chunksize = max(1, len(items) // (jobs * 8))
+    sys.stdout.flush()
+    pool = multiprocessing.Pool(
+        jobs, initializer=_init_worker,
+        initargs=((repo.namespace, repo.version), namespace.CACHE_DIR))
+    try:
+        return pool.map(_convert_in_worker, items, chunksize)
+    finally:
+        pool.close()
+        pool.join()
@@ -6,12 +6,18 @@
 # License as published by the Free Software Foundation; either
 # version 2.1 of the License, or (at your option) any later version.
 
+import hashlib
+import functools
+from collections import OrderedDict
+
 import jinja2
 
+from . import cache, docstring_cache
 from .namespace import get_namespace
-from .parser import docstring_to_rest
+from .parser import docstring_to_rest, docstring_to_rest_many, \
+    is_plain_docstring, resolve_docref
 from .debug import get_line_numbers_for_name
-from .docobj import Module
+from .docobj import Module, Deferred, get_class_hierarchy
 
 
 class Repository(object):
@@ -26,21 +32,176 @@ class Repository(object):
 
         loaded = [ns] + [get_namespace(*x) for x in ns.all_dependencies]
         self._namespaces = loaded
+        self._namespace_by_name = dict((n.namespace, n) for n in loaded)
+
+        # Merged lookup tables, the first namespace providing a key wins.
+        # The symbol tables are large and possibly memory mapped, so
+        # instead of merging them up front we remember each result.
+        self._shadow_map = {}
+        self._instance_params = {}
+        self._type_structs = {}
+        self._doc_references = {}
+        self._private = set()
+        for ns in reversed(loaded):
+            self._shadow_map.update(ns.shadow_map)
+            self._instance_params.update(ns.instance_params)
+            self._type_structs.update(ns.type_structs)
+            self._doc_references.update(ns.doc_references)
+            self._private.update(ns.private)
+        self._py_ids = {}
+        self._docrefs = {}
+
+        self._docstring_count = 0
+        self._plain_docstring_count = 0
+
+        # only used during parse()
+        self._docstring_cache = None
+        self._rendered = {}
+        # docstrings needed by self._deferred, see defer()
+        self._pending = None
+        self._deferred = None
+        self._collecting = False
 
         self._rst_env = jinja2.Environment(undefined=jinja2.StrictUndefined)
 
+    def _get_fingerprint(self):
+        """A hash of everything besides the docstring itself that
+        docstring_to_rest() depends on.
+        """
+
+        h = hashlib.sha256(cache.get_code_version().encode("ascii"))
+        for ns in self._namespaces:
+            h.update(("%s-%s:%s\n" % (
+                ns.namespace, ns.version, ns.symbols_digest)).encode("utf-8"))
+        return h.hexdigest()
+
+    def _docstring_to_rest(self, docstring, current_type=None,
+                           current_func=None):
+        if not docstring:
+            return docstring_to_rest(
+                self, docstring, current_type, current_func)
+
+        item = (docstring, current_type, current_func)
+        docstring_cache = self._docstring_cache
+        key = None
+        if docstring_cache is not None:
+            key = docstring_cache.get_key(*item)
+
+        if self._collecting:
+            if key is None or key not in docstring_cache:
+                self._pending[item] = None
+            return u""
+
+        self._docstring_count += 1
+        if is_plain_docstring(docstring):
+            self._plain_docstring_count += 1
+
+        value = None
+        if key is not None:
+            value = docstring_cache.get(key)
+
+        if value is None:
+            value = self._rendered.get(item)
+            if value is None:
+                if self._pending is not None:
+                    self._pending.pop(item, None)
+                missed_links = self.missed_links
+                rst = docstring_to_rest(self, *item)
+                value = (rst, self.missed_links - missed_links)
+            else:
+                self.missed_links += value[1]
+            if docstring_cache is not None:
+                docstring_cache.set(key, value)
+        else:
+            self.missed_links += value[1]
+        return value[0]
+
+    def defer(self, func):
+        """Returns func() or, while parse() converts docstrings in parallel,
+        a Deferred which calls func() on first use.
+
+        func() gets called once right away to find out which docstrings it
+        needs, so it shouldn't do anything besides looking up docs.
+        """
+
+        if self._pending is None:
+            return func()
+
+        self._collecting = True
+        try:
+            func()
+        finally:
+            self._collecting = False
+
+        deferred = Deferred(func)
+        self._deferred.append(deferred)
+        return deferred
+
+    def _resolve_deferred(self, jobs):
+        """Converts all docstrings still needed by Deferred instances
+        in parallel and resolves them.
+        """
+
+        items = list(self._pending)
+        deferred = self._deferred
+        self._pending = None
+        self._deferred = None
+
+        results = docstring_to_rest_many(self, items, jobs)
+        self._rendered = dict(zip(items, results))
+        try:
+            for d in deferred:
+                d.get()
+        finally:
+            self._rendered = {}
+
     def get_cache_key(self, obj):
         # If you want to cache a docobj, use this key
         return (self.namespace, self.version, obj)
 
-    def parse(self):
-        """Returns a Module instance containing the whole documentation tree"""
+    def parse(self, jobs=1):
+        """Returns a Module instance containing the whole documentation tree
+
+        If `jobs` is larger than 1 docstrings get converted using that many
+        processes.
+        """
 
         # import the right versions first so we don't have to pass the version
         # in from now on
 
-        self.import_module()
-        return Module.from_repo(self)
+        pymod = self.import_module()
+
+        if docstring_cache.CACHE_DIR:
+            self._docstring_cache = docstring_cache.open_cache(
+                self.namespace, self.version, self._get_fingerprint())
+
+        if jobs > 1:
+            self._pending = OrderedDict()
+            self._deferred = []
+
+        module = Module.from_repo(self)
+
+        if jobs > 1:
+            self._resolve_deferred(jobs)
+
+        stats = ["unresolved links: %d" % self.missed_links]
+        if self._docstring_count:
+            stats.append("plain docstrings: %d of %d (%.0f%%)" % (
+                self._plain_docstring_count, self._docstring_count,
+                100.0 * self._plain_docstring_count / self._docstring_count))
+        hierarchy_stats = get_class_hierarchy(pymod).get_stats()
+        if hierarchy_stats:
+            stats.append("child/style properties: %s" % hierarchy_stats)
+
+        if self._docstring_cache is not None:
+            self._docstring_cache.save()
+            stats.append(
+                "docstring cache: %s" % self._docstring_cache.get_stats())
+            self._docstring_cache = None
+
+        print("%s-%s: %s" % (self.namespace, self.version, "; ".join(stats)))
+
+        return module
 
     def render_override_docs(self, text, **kwargs):
         return self._rst_env.from_string(text).render(**kwargs)
@@ -75,14 +236,60 @@ class Repository(object):
         """
 
         if shadowed:
-            shadowed_c_id = self.get_shadowed(c_id)
-            if shadowed_c_id is not None:
-                c_id = shadowed_c_id
+            c_id = self._shadow_map.get(c_id, c_id)
+
+        try:
+            return self._py_ids[c_id]
+        except KeyError:
+            pass
+
+        result = []
+        for ns in self._namespaces:
+            py_ids = ns.types.get(c_id)
+            if py_ids is not None:
+                result = py_ids
+                break
+        self._py_ids[c_id] = result
+        return result
+
+    def lookup_py_ids(self, c_ids):
+        """Like lookup_py_id() for many C identifiers at once. Returns a
+        dict mapping each C identifier to a Python identifier or None.
+
+        Identifiers not looked up before are resolved with one pass over
+        the symbol table of each namespace.
+        """
+
+        shadow_map = self._shadow_map
+        known = self._py_ids
+
+        keys = {}
+        missing = set()
+        for c_id in c_ids:
+            key = keys[c_id] = shadow_map.get(c_id, c_id)
+            if key not in known:
+                missing.add(key)
 
         for ns in self._namespaces:
-            if c_id in ns.types:
-                return ns.types[c_id]
-        return []
+            if not missing:
+                break
+            types = ns.types
+            found = []
+            for key in missing:
+                py_ids = types.get(key)
+                if py_ids is not None:
+                    known[key] = py_ids
+                    found.append(key)
+            missing.difference_update(found)
+
+        for key in missing:
+            known[key] = []
+
+        result = {}
+        for c_id, key in keys.items():
+            py_ids = known[key]
+            result[c_id] = py_ids[0] if py_ids else None
+        return result
 
     def lookup_gtkdoc_ref(self, doc_ref):
         """Given a gtk-doc reference will try to find an URL to external
@@ -92,12 +299,25 @@ class Repository(object):
             "https://developer.gnome.org/gtk3/stable/gtk-x11.html#gtk-x11""
         """
 
-        for ns in self._namespaces:
-            if doc_ref in ns.doc_references:
-                # We don't want to give out URLs for things we should
-                # have locally.
-                assert self.lookup_py_id(doc_ref) is None
-                return ns.doc_references[doc_ref]
+        if doc_ref in self._doc_references:
+            # We don't want to give out URLs for things we should
+            # have locally.
+            assert self.lookup_py_id(doc_ref) is None
+            return self._doc_references[doc_ref]
+
+    def lookup_docref(self, doc_ref):
+        """Like resolve_docref() in the parser, but every gtk-doc
+        reference only gets resolved once.
+
+        e.g. "GtkEntryCompletion--inline-completion" ->
+            ("prop", "Gtk.EntryCompletion.props.inline_completion")
+        """
+
+        try:
+            return self._docrefs[doc_ref]
+        except KeyError:
+            result = self._docrefs[doc_ref] = resolve_docref(self, doc_ref)
+            return result
 
     def lookup_py_id_for_type_struct(self, struct_c_id):
         """Given a C identifier of a type struct returns the Python ID
@@ -106,19 +326,36 @@ class Repository(object):
         e.g. GObjectClass -> GObject.Object
         """
 
-        for ns in self._namespaces:
-            if struct_c_id in ns.type_structs:
-                return ns.type_structs[struct_c_id]
+        return self._type_structs.get(struct_c_id)
 
-    def _lookup_docs(self, type_, name, current_type=None, current_func=None):
-        for ns in self._namespaces:
+    def _get_owner(self, name):
+        """Returns the namespace which documents the Python identifier
+        or None, e.g. "GLib.idle_add" -> GLib-2.0
+        """
+
+        return self._namespace_by_name.get(name.split(".", 1)[0])
+
+    def _lookup_docs(self, type_, name, current_type=None, current_func=None,
+                     deferred=False):
+        # only look at the owner, so a miss doesn't load the docs of
+        # all dependencies
+        ns = self._get_owner(name)
+        if ns is not None:
             source = ns.docs[type_]
             if name in source:
-                return docstring_to_rest(self, source[name].docs,
-                                         current_type, current_func)
+                convert = functools.partial(
+                    self._docstring_to_rest,
+                    source[name].docs, current_type, current_func)
+                return self.defer(convert) if deferred else convert()
         return u""
 
     def lookup_docs(self, type_, *args, **kwargs):
+        """Returns a (docs, shadowed_docs) tuple of reST texts.
+
+        If `deferred` is True the texts can also be Deferred instances,
+        see defer().
+        """
+
         docs = self._lookup_docs(type_, *args, **kwargs)
         if type_ == "all":
             shadowed = self._lookup_docs("all_shadowed", *args, **kwargs)
@@ -128,12 +365,12 @@ class Repository(object):
         return docs, shadowed
 
     def lookup_meta(self, type_, fullname):
-        for ns in self._namespaces:
+        ns = self._get_owner(fullname)
+        if ns is not None:
             source = ns.docs[type_]
-
             if fullname in source:
                 docs, version_added, dep_version, dep = source[fullname]
-                dep = docstring_to_rest(self, dep)
+                dep = self._docstring_to_rest(dep)
                 return version_added, dep_version, dep
 
         return u"", u"", u""
@@ -143,14 +380,10 @@ class Repository(object):
         or None.
         """
 
-        for ns in self._namespaces:
-            if py_id in ns.instance_params:
-                return ns.instance_params[py_id]
+        return self._instance_params.get(py_id)
 
     def get_shadowed(self, c_id):
-        for ns in self._namespaces:
-            if c_id in ns.shadow_map:
-                return ns.shadow_map[c_id]
+        return self._shadow_map.get(c_id)
 
     def is_private(self, py_id):
         """Returns True if a Python type is considered private i.e. should
@@ -159,10 +392,7 @@ class Repository(object):
         e.g. is_private('Gtk.ViewportPrivate') -> True
         """
 
-        for ns in self._namespaces:
-            if py_id in ns.private:
-                return True
-        return False
+        return py_id in self._private
 
     def get_all_dependencies(self):
         """Returns a list of (namespace, version) tuples for all transitive
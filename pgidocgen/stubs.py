@@ -11,7 +11,7 @@ import os
 
 from .repo import Repository
 from .util import get_gir_files
-from .namespace import get_namespace, set_cache_prefix_path
+from .namespace import get_dependency_graph, set_cache_dir
 
 
 def add_parser(subparsers):
@@ -44,8 +44,8 @@ def main(args):
         print("GIR file for %s not found, aborting." % namespace)
         raise SystemExit(1)
 
-    cache_prefix = os.path.join(args.target, ".pgidocgen.cache", 'namespace')
-    set_cache_prefix_path(cache_prefix)
+    cache_dir = os.path.join(args.target, ".pgidocgen.cache", "namespaces")
+    set_cache_dir(cache_dir)
 
     namespace, version = namespace.split("-", 1)
     try:
@@ -60,15 +60,19 @@ def main(args):
         build directory is found, skipping it and all its deps.
         """
 
+        graph = get_dependency_graph()
         mods = []
-        if os.path.exists(os.path.join(dir_, namespace + ".pyi")):
-            return mods
-        mods.append((namespace, version))
 
-        ns = get_namespace(namespace, version)
-        for dep in ns.dependencies:
-            mods.extend(get_to_write(dir_, *dep))
+        def visit(key):
+            if key in mods:
+                return
+            if os.path.exists(os.path.join(dir_, key[0] + ".pyi")):
+                return
+            mods.append(key)
+            for dep in graph.get_dependencies(key):
+                visit(dep)
 
+        visit((namespace, version))
         return mods
 
     for namespace, version in get_to_write(args.target, namespace, version):
@@ -0,0 +1,174 @@
+# Copyright 2026 Christoph Reiter
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+
+"""A compact read-only mapping of C identifiers to lists of Python
+identifiers which can be used directly from a memory mapped file.
+
+Layout, all integers are native uint32:
+
+    magic (8 bytes), byte order mark, number of keys, number of hash slots
+    key offsets (keys + 1)
+    value offsets (keys + 1)
+    hash slots, the key index or EMPTY
+    string data (UTF-8), all keys followed by the values of each key
+    joined by NUL
+
+Keys are sorted, lookups go through an open addressing hash table
+using crc32.
+"""
+
+import zlib
+from array import array
+from collections.abc import Mapping
+
+
+_MAGIC = b"PGISYMT2"
+_BOM = 0x01020304
+_EMPTY = 0xffffffff
+_HEADER_SIZE = len(_MAGIC) + 3 * 4
+
+assert array("I").itemsize == 4
+
+
+def _get_slot_count(count):
+    slots = 1
+    while slots < count * 2:
+        slots *= 2
+    return slots
+
+
+def dump_symbol_table(mapping):
+    """Returns the binary representation of a mapping of strings to
+    lists of strings.
+    """
+
+    keys = sorted(mapping)
+    data = bytearray()
+    key_offsets = array("I")
+    value_offsets = array("I")
+    encoded_keys = []
+
+    for key in keys:
+        key_offsets.append(len(data))
+        encoded = key.encode("utf-8")
+        encoded_keys.append(encoded)
+        data += encoded
+    key_offsets.append(len(data))
+
+    for key in keys:
+        value_offsets.append(len(data))
+        data += u"\x00".join(mapping[key]).encode("utf-8")
+    value_offsets.append(len(data))
+
+    slot_count = _get_slot_count(len(keys))
+    mask = slot_count - 1
+    slots = array("I", [_EMPTY]) * slot_count
+    for i, encoded in enumerate(encoded_keys):
+        pos = zlib.crc32(encoded) & mask
+        while slots[pos] != _EMPTY:
+            pos = (pos + 1) & mask
+        slots[pos] = i
+
+    header = array("I", [_BOM, len(keys), slot_count])
+    return b"".join([
+        _MAGIC, header.tobytes(), key_offsets.tobytes(),
+        value_offsets.tobytes(), slots.tobytes(), bytes(data)])
+
+
+class SymbolTable(Mapping):
+    """A read-only mapping on top of the output of dump_symbol_table().
+
+    `buffer` is either bytes or a mmap, `offset` and `size` give the
+    location of the table in it. Values are returned as new lists.
+    """
+
+    def __init__(self, buffer, offset=0, size=None):
+        if size is None:
+            size = len(buffer) - offset
+        view = memoryview(buffer)[offset:offset + size]
+        if view[:len(_MAGIC)] != _MAGIC:
+            raise ValueError("invalid symbol table")
+        if len(view) < _HEADER_SIZE:
+            raise ValueError("truncated symbol table")
+        bom, key_count, slot_count = \
+            view[len(_MAGIC):_HEADER_SIZE].cast("I")
+        if bom != _BOM:
+            raise ValueError("symbol table has the wrong byte order")
+        data_start = _HEADER_SIZE + (2 * key_count + 2 + slot_count) * 4
+        if len(view) < data_start:
+            raise ValueError("truncated symbol table")
+
+        def take(start, count):
+            end = start + count * 4
+            return view[start:end].cast("I"), end
+
+        pos = _HEADER_SIZE
+        self._key_offsets, pos = take(pos, key_count + 1)
+        self._value_offsets, pos = take(pos, key_count + 1)
+        self._slots, pos = take(pos, slot_count)
+        if len(view) - data_start < self._value_offsets[-1]:
+            raise ValueError("truncated symbol table")
+
+        # slicing the buffer itself is cheaper than slicing a memoryview
+        # and gives us bytes
+        self._buffer = buffer
+        self._data_start = offset + data_start
+        self._len = key_count
+        self._mask = slot_count - 1
+
+    def _find(self, key):
+        if not isinstance(key, str):
+            return -1
+        encoded = key.encode("utf-8")
+        slots = self._slots
+        key_offsets = self._key_offsets
+        buffer_ = self._buffer
+        start = self._data_start
+        mask = self._mask
+        pos = zlib.crc32(encoded) & mask
+        while True:
+            index = slots[pos]
+            if index == _EMPTY:
+                return -1
+            if buffer_[start + key_offsets[index]:
+                       start + key_offsets[index + 1]] == encoded:
+                return index
+            pos = (pos + 1) & mask
+
+    def _get_string(self, offsets, index):
+        start = self._data_start
+        return self._buffer[start + offsets[index]:
+                            start + offsets[index + 1]].decode("utf-8")
+
+    def __contains__(self, key):
+        return self._find(key) != -1
+
+    def get(self, key, default=None):
+        index = self._find(key)
+        if index == -1:
+            return default
+        value = self._get_string(self._value_offsets, index)
+        if not value:
+            return []
+        return value.split(u"\x00")
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        offsets = self._key_offsets
+        for i in range(self._len):
+            yield self._get_string(offsets, i)
+
+    def __len__(self):
+        return self._len
+
+    def __repr__(self):
+        return "<%s keys=%d>" % (type(self).__name__, self._len)
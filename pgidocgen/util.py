@@ -19,6 +19,8 @@ from contextlib import contextmanager
 
 from docutils.core import publish_parts
 
+from .girheader import scan_gir_header
+
 
 _KWD_RE = re.compile("^(%s)$" % "|".join(keyword.kwlist + ["print", "exec"]))
 
@@ -56,19 +58,9 @@ def shell(cmd):
 
 
 def parse_gir_shared_libs(gir_path):
-    """Returns a list of shared libraries for a .gir file.
-
-    XXX: This doesn't parse the file properly.. but it's fast.
-    """
+    """Returns a list of shared libraries for a .gir file."""
 
-    shared_libs = []
-    with open(gir_path, "rb") as h:
-        for line in h.read().decode("utf-8").splitlines():
-            line = line.strip()
-            if line.startswith("shared-library="):
-                shared_libs.extend(line.split("=")[-1].strip("\"").split(","))
-                break
-    return list(filter(None, shared_libs))
+    return scan_gir_header(gir_path).shared_libraries
 
 
 def cache_calls(func):
@@ -86,61 +78,24 @@ def cache_calls(func):
 def get_child_properties(cls):
     """Returns a list of GParamSpecs or an empty list"""
 
-    try:
-        Gtk = import_namespace("Gtk", "3.0")
-    except ImportError:
-        return []
-
-    if not issubclass(cls, Gtk.Container):
-        return []
-
-    def get_props(cls):
-        class_struct = cls._get_class_struct(Gtk.ContainerClass)
-        return class_struct.list_child_properties()
-
-    # only get properties the base classes don't have
-    all_props = get_props(cls)
-    names = dict((p.name, p) for p in all_props)
-
-    for base in fake_mro(cls)[1:]:
-        if not issubclass(base, Gtk.Container):
-            break
-        for p in get_props(base):
-            names.pop(p.name, None)
-
-    return names.values()
+    return ClassHierarchy().get_child_properties(cls)
 
 
 def get_style_properties(cls):
     """Returns a list of GParamSpecs or an empty list"""
 
-    try:
-        Gtk = import_namespace("Gtk", "3.0")
-    except ImportError:
-        return []
-
-    if not issubclass(cls, Gtk.Widget):
-        return []
-
-    def get_props(cls):
-        class_struct = cls._get_class_struct(Gtk.WidgetClass)
-        return class_struct.list_style_properties()
-
-    # only get properties the base classes don't have
-    all_props = get_props(cls)
-    names = dict((p.name, p) for p in all_props)
+    return ClassHierarchy().get_style_properties(cls)
 
-    for base in fake_mro(cls)[1:]:
-        if not issubclass(base, Gtk.Widget):
-            break
-        for p in get_props(base):
-            names.pop(p.name, None)
 
-    return names.values()
+def iter_public_attr(obj, names=None):
+    """Yields (name, value) tuples for all public attributes of `obj` or
+    only for the ones in `names`, sorted by name.
+    """
 
+    if names is None:
+        names = dir(obj)
 
-def iter_public_attr(obj):
-    for attr in sorted(dir(obj)):
+    for attr in sorted(names):
         if attr.startswith("_") and not attr == "_":
             continue
 
@@ -155,6 +110,22 @@ def iter_public_attr(obj):
         yield attr, attr_obj
 
 
+def iter_owned_public_attr(cls):
+    """Like iter_public_attr() but only for the attributes for which
+    is_attribute_owner() is True.
+
+    pgi creates methods, vfuncs and fields on first access through
+    descriptors which it puts on the class they belong to. Looking at the
+    class dicts first means inherited attributes never get accessed.
+    """
+
+    names = set(cls.__dict__)
+    ovr = get_overridden_class(cls)
+    if ovr:
+        names.update(ovr.__dict__)
+    return iter_public_attr(cls, names)
+
+
 def escape_identifier(text, reg=_KWD_RE):
     """Escape C identifiers (or a part of them)
     so they can be used as attributes/arguments
@@ -359,15 +330,7 @@ def escape_rest(text):
 def fake_subclasses(cls):
     """Gives a list of subclasses, replacing classes by their overrides"""
 
-    subs = []
-    for sub in cls.__subclasses__():
-        for subsub in fake_subclasses(sub):
-            if get_overridden_class(subsub) is sub:
-                subs.append(subsub)
-                break
-        else:
-            subs.append(sub)
-    return subs
+    return ClassHierarchy().get_subclasses(cls)
 
 
 def fake_bases(obj, ignore_redundant=False):
@@ -375,48 +338,175 @@ def fake_bases(obj, ignore_redundant=False):
     bases are ignored.
     """
 
-    # hide overrides by merging the bases in
-    possible_bases = []
-    known = set()
-    for base in obj.__bases__:
-        new_bases = []
-        if base.__name__ == obj.__name__ and base.__module__ == obj.__module__:
-            for upper_base in fake_bases(base,
-                                         ignore_redundant=ignore_redundant):
-                new_bases.append(upper_base)
+    return ClassHierarchy().get_bases(obj, ignore_redundant)
+
+
+def fake_mro(obj):
+    return ClassHierarchy().get_mro(obj)
+
+
+class ClassHierarchy(object):
+    """Gives the same results as fake_bases(), fake_mro() and
+    fake_subclasses() but remembers them, so every class is only looked
+    at once. The same goes for the child and style properties.
+
+    The subclasses of a class change whenever a new class gets created,
+    so an instance should only be used once all classes of interest
+    exist.
+    """
+
+    def __init__(self):
+        self._bases = {}
+        self._mro = {}
+        self._mro_members = {}
+        self._subclasses = {}
+        self._class_props = {}
+        self._class_prop_lookups = 0
+
+    def get_bases(self, obj, ignore_redundant=False):
+        key = (obj, ignore_redundant)
+        try:
+            return list(self._bases[key])
+        except KeyError:
+            pass
+
+        # hide overrides by merging the bases in
+        possible_bases = set()
+        known = set()
+        for base in obj.__bases__:
+            new_bases = []
+            if base.__name__ == obj.__name__ and \
+                    base.__module__ == obj.__module__:
+                new_bases.extend(self.get_bases(base, ignore_redundant))
+            else:
+                new_bases.append(base)
+
+            for new_base in new_bases:
+                if not ignore_redundant or new_base not in known:
+                    possible_bases.add(new_base)
+
+            known.update(base.__mro__)
+
+        # preserve the mro
+        bases = self._bases[key] = tuple(
+            [base for base in obj.__mro__ if base in possible_bases])
+        return list(bases)
+
+    def _get_mro_members(self, obj):
+        # the set of all classes fake_mro() includes
+        try:
+            return self._mro_members[obj]
+        except KeyError:
+            pass
+
+        members = set([obj])
+        for base in self.get_bases(obj):
+            members.update(self._get_mro_members(base))
+        self._mro_members[obj] = members
+        return members
+
+    def get_mro(self, obj):
+        try:
+            return list(self._mro[obj])
+        except KeyError:
+            pass
+
+        # preserve the real mro
+        members = self._get_mro_members(obj)
+        mro = self._mro[obj] = tuple(
+            [base for base in obj.__mro__ if base in members])
+        return list(mro)
+
+    def get_subclasses(self, cls):
+        try:
+            return list(self._subclasses[cls])
+        except KeyError:
+            pass
+
+        subs = []
+        for sub in cls.__subclasses__():
+            for subsub in self.get_subclasses(sub):
+                if get_overridden_class(subsub) is sub:
+                    subs.append(subsub)
+                    break
+            else:
+                subs.append(sub)
+        self._subclasses[cls] = tuple(subs)
+        return subs
+
+    def _get_class_props(self, cls, kind):
+        # All child/style properties the class struct knows about,
+        # including the ones of the base classes, and a set of their names
+        self._class_prop_lookups += 1
+        key = (cls, kind)
+        try:
+            return self._class_props[key]
+        except KeyError:
+            pass
+
+        Gtk = import_namespace("Gtk", "3.0")
+        if kind == "child":
+            class_struct = cls._get_class_struct(Gtk.ContainerClass)
+            props = class_struct.list_child_properties()
         else:
-            new_bases.append(base)
+            class_struct = cls._get_class_struct(Gtk.WidgetClass)
+            props = class_struct.list_style_properties()
+        result = self._class_props[key] = (
+            props, frozenset([p.name for p in props]))
+        return result
 
-        for new_base in new_bases:
-            if not ignore_redundant or new_base not in known:
-                possible_bases.append(new_base)
+    def _get_own_class_props(self, cls, kind, base_type):
+        # only get properties the base classes don't have
+        all_props = self._get_class_props(cls, kind)[0]
+        names = dict((p.name, p) for p in all_props)
 
-        known.update(base.__mro__)
+        inherited = set()
+        for base in self.get_mro(cls)[1:]:
+            if not issubclass(base, base_type):
+                break
+            inherited.update(self._get_class_props(base, kind)[1])
 
-    # preserve the mro
-    mro_bases = []
-    for base in obj.__mro__:
-        if base in possible_bases:
-            mro_bases.append(base)
-    return mro_bases
+        for name in inherited.intersection(names):
+            del names[name]
 
+        return list(names.values())
 
-def fake_mro(obj):
+    def get_child_properties(self, cls):
+        """Returns a list of GParamSpecs or an empty list"""
+
+        try:
+            Gtk = import_namespace("Gtk", "3.0")
+        except ImportError:
+            return []
+
+        if not issubclass(cls, Gtk.Container):
+            return []
+
+        return self._get_own_class_props(cls, "child", Gtk.Container)
+
+    def get_style_properties(self, cls):
+        """Returns a list of GParamSpecs or an empty list"""
+
+        try:
+            Gtk = import_namespace("Gtk", "3.0")
+        except ImportError:
+            return []
 
-    def get_mro(obj):
-        mro = [obj]
-        for base in fake_bases(obj):
-            mro.extend(get_mro(base))
-        return mro
+        if not issubclass(cls, Gtk.Widget):
+            return []
 
-    possible_mro = get_mro(obj)
+        return self._get_own_class_props(cls, "style", Gtk.Widget)
 
-    # preserve the real mro
-    mro_bases = []
-    for base in obj.__mro__:
-        if base in possible_mro:
-            mro_bases.append(base)
-    return mro_bases
+    def get_stats(self):
+        """Returns a short summary of the child/style property lookups or
+        an empty string if there weren't any.
+        """
+
+        if not self._class_prop_lookups:
+            return u""
+        queried = len(self._class_props)
+        return "%d class struct queries, %d saved" % (
+            queried, self._class_prop_lookups - queried)
 
 
 def is_staticmethod(parent, name):
@@ -574,6 +664,23 @@ def import_namespace(namespace, version=None, ignore_version=False):
         return mod
 
 
+def get_typelib_path(namespace, version):
+    """Returns the path of the typelib which would be used for the
+    namespace or None.
+
+    Looks through the typelib search path of GIRepository (which includes
+    GI_TYPELIB_PATH) without importing the namespace.
+    """
+
+    from pgi.clib.gir import GIRepository
+
+    filename = "%s-%s.typelib" % (namespace, version)
+    for dir_ in GIRepository.get_default().get_search_path():
+        path = os.path.join(dir_, filename)
+        if os.path.isfile(path):
+            return path
+
+
 def get_module_version(module):
     return module._version
 
@@ -0,0 +1,201 @@
+# Copyright 2026 Christoph Reiter
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+
+import argparse
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+from multiprocessing.pool import ThreadPool
+
+from .build import get_cpu_count
+from .util import get_gir_files
+from .namespace import set_cache_dir, get_namespace, get_cache_entry_path, \
+    get_dependency_graph
+
+
+def add_parser(subparsers):
+    parser = subparsers.add_parser(
+        "warm-cache",
+        help="Parse all gir files in parallel and fill the namespace cache")
+    parser.add_argument('target',
+                        help='path to where the resulting source should be')
+    parser.add_argument('namespace', nargs="*",
+                        help='namespace including version e.g. Gtk-3.0, '
+                             'including all dependencies. Defaults to all '
+                             'installed ones.')
+    parser.add_argument('-j', '--jobs', type=int, default=get_cpu_count(),
+                        help='number of namespaces to parse in parallel')
+    parser.add_argument('--single', action='store_true',
+                        help=argparse.SUPPRESS)
+    parser.set_defaults(func=main)
+
+
+def _get_cache_dir(target):
+    return os.path.join(target, ".pgidocgen.cache", "namespaces")
+
+
+def _main_single(target, key):
+    """Loads or creates the cache entry for one namespace and prints the
+    stats as JSON on the last line.
+    """
+
+    set_cache_dir(_get_cache_dir(target))
+    namespace, version = key.split("-", 1)
+    path = get_cache_entry_path(namespace, version)
+    cached = os.path.exists(path)
+    start = time.time()
+    try:
+        get_namespace(namespace, version)
+    except ImportError as e:
+        print("Import failed: %s" % (e,))
+        raise SystemExit(1)
+    print(json.dumps({
+        "cached": cached,
+        "time": time.time() - start,
+        "size": os.path.getsize(path),
+    }))
+
+
+def _warm(target, key):
+    start = time.time()
+    result = subprocess.run(
+        [sys.executable, sys.argv[0], "warm-cache", "--single", target, key],
+        stdout=subprocess.PIPE)
+    output = result.stdout.decode("utf-8", "replace").splitlines()
+    try:
+        if result.returncode != 0 or not output:
+            raise ValueError
+        stats = json.loads(output[-1])
+    except ValueError:
+        for line in output:
+            print("%s: %s" % (key, line))
+        return key, "failed", {"time": time.time() - start}
+    return key, "cached" if stats["cached"] else "parsed", stats
+
+
+def _format_result(key, status, info):
+    if status in ("parsed", "cached"):
+        text = "%s in %.2fs, %.1f MB" % (
+            status, info["time"], info["size"] / 1024 ** 2)
+    elif status == "failed":
+        text = "failed after %.2fs" % info["time"]
+    else:
+        text = "%s (%s)" % (status, info["reason"])
+    return "%s: %s" % (key, text)
+
+
+def _get_plan(graph, keys):
+    """Takes a DependencyGraph and a list of '{namespace}-{version}' keys.
+
+    Returns a {key: set([key, ...])} dict with the direct dependencies of
+    all namespaces which need to be parsed, including all dependencies of
+    the given ones, and a {key: result} dict for the ones skipped because
+    their gir file is missing.
+
+    Raises ValueError in case of a dependency cycle.
+    """
+
+    order = graph.get_build_order(tuple(k.split("-", 1)) for k in keys)
+
+    pending = {}
+    results = {}
+    for dep in order:
+        key = "%s-%s" % dep
+        if dep in graph:
+            pending[key] = set(
+                "%s-%s" % d for d in graph.get_dependencies(dep))
+        else:
+            results[key] = (key, "skipped", {"reason": "GIR file not found"})
+    return pending, results
+
+
+def main(args):
+    target = os.path.abspath(args.target)
+
+    if args.single:
+        return _main_single(target, args.namespace[0])
+
+    girs = get_gir_files()
+    for key in args.namespace:
+        if key not in girs:
+            print("GIR file for %s not found, aborting." % key)
+            raise SystemExit(1)
+
+    try:
+        pending, results = _get_plan(
+            get_dependency_graph(), args.namespace or sorted(girs))
+    except ValueError as e:
+        print(e)
+        raise SystemExit(1)
+    num_total = len(pending) + len(results)
+
+    set_cache_dir(_get_cache_dir(target))
+
+    start = time.time()
+    lock = threading.Lock()
+    running = set()
+    pool = ThreadPool(max(args.jobs, 1))
+    event = threading.Event()
+
+    def add_result(result):
+        results[result[0]] = result
+        print("[%d/%d] %s" % (len(results), num_total, _format_result(*result)))
+
+    def job_cb(result=None):
+        with lock:
+            if result is not None:
+                running.discard(result[0])
+                add_result(result)
+
+            for key in get_new_jobs():
+                running.add(key)
+                pool.apply_async(_warm, [target, key], callback=job_cb)
+
+            if not running:
+                event.set()
+
+    def get_new_jobs():
+        jobs = []
+        changed = True
+        while changed:
+            changed = False
+            for key, deps in sorted(pending.items()):
+                if deps - set(results):
+                    continue
+                del pending[key]
+                failed = sorted(
+                    d for d in deps
+                    if results[d][1] not in ("parsed", "cached"))
+                if failed:
+                    add_result((key, "skipped", {
+                        "reason": "depends on %s" % ", ".join(failed)}))
+                    changed = True
+                else:
+                    jobs.append(key)
+        return jobs
+
+    for key in sorted(results):
+        print(_format_result(*results[key]))
+
+    job_cb()
+    event.wait()
+    pool.close()
+    pool.join()
+
+    counts = {}
+    for key, status, info in results.values():
+        counts[status] = counts.get(status, 0) + 1
+    print("%d parsed, %d cached, %d failed, %d skipped in %.1fs" % (
+        counts.get("parsed", 0), counts.get("cached", 0),
+        counts.get("failed", 0), counts.get("skipped", 0),
+        time.time() - start))
+
+    if counts.get("failed") or counts.get("skipped"):
+        return 1
@@ -0,0 +1,60 @@
+# Copyright 2026 Christoph Reiter
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from pgidocgen.parser import docstring_to_rest
+from pgidocgen.bench_parser import load_corpus, save_corpus, benchmark, \
+    format_summary, format_comparison, STAGES, _NullRepository, _convert
+
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "parser-corpus.json")
+
+
+class TBenchParser(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_corpus(self):
+        corpus = load_corpus(CORPUS)
+        self.assertTrue(corpus)
+        path = os.path.join(self.dir, "corpus.json")
+        save_corpus(path, corpus)
+        self.assertEqual(load_corpus(path), corpus)
+
+    def test_stages(self):
+        # the stages together do the same as docstring_to_rest()
+        repo = _NullRepository()
+        for key, name, docstring in load_corpus(CORPUS):
+            self.assertEqual(_convert(repo, docstring)[0],
+                             docstring_to_rest(repo, docstring))
+
+    def test_benchmark(self):
+        corpus = load_corpus(CORPUS)
+        summary = benchmark(
+            corpus, 2, get_repository=lambda key: _NullRepository())
+        summary = json.loads(json.dumps(summary))
+
+        self.assertEqual(summary["total"]["docstrings"], len(corpus))
+        self.assertEqual(sorted(summary["stages"]), sorted(STAGES))
+        self.assertEqual(
+            summary["stages"]["escape"]["docstrings"] +
+            summary["stages"]["plain"]["docstrings"], len(corpus))
+        self.assertEqual(len(summary["slowest"]), 20)
+        times = [e["time"] for e in summary["slowest"]]
+        self.assertEqual(times, sorted(times, reverse=True))
+
+        self.assertTrue(format_summary(summary))
+        self.assertTrue("total" in format_comparison(summary, summary))
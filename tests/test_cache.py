@@ -0,0 +1,54 @@
+# Copyright 2026 Christoph Reiter
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pgidocgen import cache
+
+
+class TCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_write_atomic(self):
+        path = os.path.join(self.dir, "foo")
+        cache.write_atomic(path, b"foo")
+        cache.write_atomic(path, b"bar")
+        with open(path, "rb") as h:
+            self.assertEqual(h.read(), b"bar")
+        self.assertEqual(os.listdir(self.dir), ["foo"])
+
+    def test_hash_files(self):
+        path = os.path.join(self.dir, "foo")
+        cache.write_atomic(path, b"foo")
+        digest = cache.hash_files([path, None])
+        self.assertEqual(len(digest), 64)
+        self.assertEqual(digest, cache.hash_files([path, None]))
+        self.assertNotEqual(digest, cache.hash_files([path]))
+        cache.write_atomic(path, b"bar")
+        self.assertNotEqual(digest, cache.hash_files([path, None]))
+
+    def test_remove_stale(self):
+        old = cache.get_entry_path(self.dir, "Foo-1.0", "a" * 64, ".pickle")
+        new = cache.get_entry_path(self.dir, "Foo-1.0", "b" * 64, ".pickle")
+        other = cache.get_entry_path(
+            self.dir, "Foo-1.0.Bar", "a" * 64, ".pickle")
+        for path in [old, new, other]:
+            cache.write_atomic(path, b"")
+
+        self.assertEqual(
+            cache.remove_stale(self.dir, "Foo-1.0", "b" * 64, ".pickle"), 1)
+        self.assertEqual(
+            sorted(os.listdir(self.dir)),
+            sorted(os.path.basename(p) for p in [new, other]))
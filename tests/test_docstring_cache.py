@@ -0,0 +1,81 @@
+# Copyright 2026 Christoph Reiter
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pgidocgen.docstring_cache import DocstringCache
+
+
+class TDocstringCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "Foo-1.0.docstrings")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_key(self):
+        c = DocstringCache(self.path, "a")
+        key = c.get_key("foo", "Foo.Bar", "Foo.Bar.baz")
+        self.assertEqual(key, c.get_key("foo", "Foo.Bar", "Foo.Bar.baz"))
+        self.assertNotEqual(key, c.get_key("foo", "Foo.Bar"))
+        self.assertNotEqual(key, c.get_key("bar", "Foo.Bar", "Foo.Bar.baz"))
+        self.assertNotEqual(c.get_key("foo", "Foo.Bar"),
+                            c.get_key("foo", None, "Foo.Bar"))
+        self.assertNotEqual(
+            key, DocstringCache(self.path, "b").get_key(
+                "foo", "Foo.Bar", "Foo.Bar.baz"))
+
+    def test_save_load(self):
+        c = DocstringCache(self.path, "a")
+        c.load()
+        key = c.get_key("foo")
+        self.assertEqual(c.get(key), None)
+        c.set(key, (u"bar", 1))
+        self.assertEqual(c.get(key), (u"bar", 1))
+        self.assertEqual((c.hits, c.misses), (1, 1))
+        c.save()
+
+        c = DocstringCache(self.path, "a")
+        c.load()
+        self.assertEqual(len(c), 1)
+        self.assertEqual(c.get(key), (u"bar", 1))
+
+        # hits alone don't rewrite the file
+        os.remove(self.path)
+        c.save()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_broken(self):
+        with open(self.path, "wb") as h:
+            h.write(b"nope")
+        c = DocstringCache(self.path, "a")
+        c.load()
+        self.assertEqual(len(c), 0)
+        c.set(c.get_key("foo"), (u"bar", 0))
+        c.save()
+
+    def test_evict(self):
+        c = DocstringCache(self.path, "a", max_bytes=0)
+        c.set(c.get_key("foo"), (u"x" * 100, 0))
+        single = c.size
+        c.max_bytes = single * 2
+        c.set(c.get_key("bar"), (u"x" * 100, 0))
+        c.get(c.get_key("foo"))
+        c.set(c.get_key("baz"), (u"x" * 100, 0))
+        c.save()
+
+        c = DocstringCache(self.path, "a")
+        c.load()
+        self.assertEqual(c.size, single * 2)
+        self.assertTrue(c.get(c.get_key("foo")))
+        self.assertTrue(c.get(c.get_key("baz")))
+        self.assertFalse(c.get(c.get_key("bar")))
@@ -9,6 +9,7 @@
 import unittest
 
 from pgidocgen.repo import docstring_to_rest
+from pgidocgen.parser import is_plain_docstring, resolve_docref, _join_rest
 from pgidocgen.namespace import get_base_types
 
 
@@ -54,9 +55,15 @@ class DummyRepo(object):
     def lookup_gtkdoc_ref(self, doc_ref):
         return self.docrefs.get(doc_ref)
 
+    def lookup_docref(self, doc_ref):
+        return resolve_docref(self, doc_ref)
+
     def lookup_py_id(self, c_id):
         return self.types.get(c_id, [None])[0]
 
+    def lookup_py_ids(self, c_ids):
+        return dict((c_id, self.lookup_py_id(c_id)) for c_id in c_ids)
+
     def lookup_py_id_for_type_struct(self, c_id):
         return self.type_structs.get(c_id)
 
@@ -91,6 +98,42 @@ class TDocstring(unittest.TestCase):
         self.check("<, == or >", "<, == or >")
         self.check("&,;", "&,;")
 
+    def test_plain(self):
+        self.assertTrue(is_plain_docstring("Foo bar."))
+        self.assertTrue(is_plain_docstring("A #GtkWidget or %NULL.\n\nFoo\n"))
+        self.assertFalse(is_plain_docstring("- foo"))
+        self.assertFalse(is_plain_docstring("foo\n1. bar"))
+        self.assertFalse(is_plain_docstring("foo  bar"))
+        self.assertFalse(is_plain_docstring("a `b`"))
+        self.assertFalse(is_plain_docstring(""))
+
+        self.check("A #GtkWidget\nor %NULL.\n\nFoo\n",
+                   "A :obj:`Gtk.Widget`\nor :obj:`None`.\n\nFoo\n")
+        self.check("foo_bar: baz", "foo\\_bar\\: baz")
+
+    def test_join_rest(self):
+        self.assertEqual(_join_rest([]), "")
+        self.assertEqual(_join_rest(["a", "", "b"]), "ab")
+        self.assertEqual(_join_rest(["``a``", "", "``b``"]), "``a`` ``b``")
+        self.assertEqual(_join_rest(["a_", "_b", "c"]), "a_ _bc")
+        self.assertEqual(_join_rest(["a:", "b", "@c"]), "a:b@c")
+
+    def test_comments(self):
+        self.check("a <!-- c --> b", "a  c  b")
+        self.check(
+            "<keycombo><keycap>Ctrl</keycap><!--x--><keycap>A</keycap>"
+            "</keycombo>", "Ctrl + A")
+
+    def test_whitespace(self):
+        # whitespace-only text becomes a single newline or space
+        self.check("<note><para>a</para>\n\n<para>b</para></note>",
+                   "a\n\nb")
+        self.check(
+            "<para>\nFoo <literal>a</literal>\n\n<literal>b</literal>\n"
+            "</para>", "\nFoo ``a``\n``b``")
+        self.check("Use <literal>a</literal>\t<literal>b</literal> here.",
+                   "Use ``a`` ``b`` here.")
+
     def test_prog(self):
         self.check("""
 |[<!-- language="C" -->
@@ -0,0 +1,94 @@
+# Copyright 2026 Christoph Reiter
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pgidocgen.girheader import scan_gir_header, DependencyGraph
+
+
+GIR = """\
+<?xml version="1.0"?>
+<repository version="1.2" xmlns="http://www.gtk.org/introspection/core/1.0"
+            xmlns:c="http://www.gtk.org/introspection/c/1.0">
+  %s
+  <namespace name="%s" version="1.0" shared-library="libfoo.so.1,libbar.so"
+             c:identifier-prefixes="Foo" c:symbol-prefixes="foo">
+    <broken
+"""
+
+
+class TGirHeader(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write_girs(self, girs):
+        paths = {}
+        for name, includes in girs:
+            key = name + "-1.0"
+            paths[key] = path = os.path.join(self.dir, key + ".gir")
+            with open(path, "w", encoding="utf-8") as h:
+                h.write(GIR % ("".join(
+                    '<include name="%s" version="1.0"/>' % i
+                    for i in includes), name))
+        return paths
+
+    def test_scan_gir_header(self):
+        path = self._write_girs([("Foo", ["Bar"])])["Foo-1.0"]
+        with open(path, "r+", encoding="utf-8") as h:
+            data = h.read().replace("<namespace", '<package name="foo-1"/>'
+                                                  '<namespace')
+            h.seek(0)
+            h.write(data)
+
+        header = scan_gir_header(path)
+        self.assertEqual(header.includes, [("Bar", "1.0")])
+        self.assertEqual(header.packages, ["foo-1"])
+        self.assertEqual(header.namespace, "Foo")
+        self.assertEqual(header.version, "1.0")
+        self.assertEqual(header.shared_libraries, ["libfoo.so.1", "libbar.so"])
+        self.assertEqual(header.c_identifier_prefixes, ["Foo"])
+        self.assertEqual(header.c_symbol_prefixes, ["foo"])
+
+    def test_dependency_graph(self):
+        graph = DependencyGraph(self._write_girs([
+            ("Foo", []),
+            ("Bar", ["Foo", "GLib"]),
+            ("Baz", ["Bar", "Missing"]),
+            ("GLib", []),
+        ]))
+
+        self.assertEqual(graph.get_dependencies(("Foo", "1.0")),
+                         [("GObject", "2.0")])
+        self.assertEqual(graph.get_dependencies(("GLib", "1.0")), [])
+        self.assertEqual(graph.get_dependencies(("Bar", "1.0")),
+                         [("Foo", "1.0"), ("GLib", "1.0")])
+        self.assertEqual(
+            graph.get_all_dependencies(("Baz", "1.0")),
+            [("Missing", "1.0"), ("Bar", "1.0"), ("GLib", "1.0"),
+             ("Foo", "1.0"), ("GObject", "2.0")])
+        self.assertEqual(
+            graph.get_build_order([("Baz", "1.0")]),
+            [("GObject", "2.0"), ("Foo", "1.0"), ("GLib", "1.0"),
+             ("Bar", "1.0"), ("Missing", "1.0"), ("Baz", "1.0")])
+        self.assertTrue(("Foo", "1.0") in graph)
+        self.assertFalse(("Missing", "1.0") in graph)
+        self.assertRaises(KeyError, graph.get_header, ("Missing", "1.0"))
+
+    def test_dependency_cycle(self):
+        graph = DependencyGraph(self._write_girs([
+            ("Foo", ["Bar"]),
+            ("Bar", ["Foo"]),
+        ]))
+        self.assertRaises(
+            ValueError, graph.get_build_order, [("Foo", "1.0")])
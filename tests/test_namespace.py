@@ -6,10 +6,61 @@
 # version 2.1 of the License, or (at your option) any later version.
 
 
+import os
+import pickle
+import shutil
+import tempfile
+import types
 import unittest
 
 from pgidocgen.namespace import get_cairo_types, \
-    fixup_since, get_versions, get_namespace
+    fixup_since, get_versions, get_namespace, parse_gir, _CacheEntry, \
+    _load_cached_namespace, Namespace, _GirCache, _AttributeIndex, \
+    DocEntry, _get_cache_digest
+from pgidocgen.symbols import SymbolTable
+from pgidocgen import util
+
+
+GIR = """\
+<?xml version="1.0"?>
+<repository version="1.2"
+            xmlns="http://www.gtk.org/introspection/core/1.0"
+            xmlns:c="http://www.gtk.org/introspection/c/1.0"
+            xmlns:glib="http://www.gtk.org/introspection/glib/1.0">
+  <include name="GObject" version="2.0"/>
+  <namespace name="Foo" version="1.0" shared-library="libfoo.so.1,libbar.so.2">
+    <record name="BarPrivate" c:type="FooBarPrivate" disguised="1">
+      <source-position filename="foo.h" line="1"/>
+    </record>
+    <record name="BazPrivate" c:type="FooBazPrivate">
+      <field name="x"><type name="gint" c:type="gint"/></field>
+    </record>
+    <class name="Bar" c:type="FooBar" glib:type-name="FooBar">
+      <doc xml:space="preserve">A bar.
+Since: 1.1</doc>
+      <method name="frob" c:identifier="foo_bar_frob" version="1.2">
+        <doc xml:space="preserve">Frobs &amp; stuff&#x1c;</doc>
+        <doc-deprecated xml:space="preserve">Don't</doc-deprecated>
+        <parameters>
+          <instance-parameter name="bar">
+            <doc xml:space="preserve">a bar</doc>
+          </instance-parameter>
+        </parameters>
+      </method>
+      <method name="frob_full" c:identifier="foo_bar_frob_full"
+              shadowed-by="frob_all" introspectable="0">
+        <doc xml:space="preserve">Frobs more</doc>
+      </method>
+      <method name="frob_all" c:identifier="foo_bar_frob_all"
+              shadows="frob_full">
+      </method>
+      <virtual-method name="draw">
+        <doc xml:space="preserve">vfunc</doc>
+      </virtual-method>
+    </class>
+  </namespace>
+</repository>
+"""
 
 
 class TNamespace(unittest.TestCase):
@@ -149,6 +200,174 @@ class TNamespace(unittest.TestCase):
         self.assertTrue(("GObject", "2.0") in deps)
         self.assertTrue(("GLib", "2.0") in deps)
 
+    def test_parse_gir(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "Foo-1.0.gir")
+            with open(path, "w", encoding="utf-8") as h:
+                h.write(GIR)
+            gir = parse_gir(path)
+        finally:
+            shutil.rmtree(temp_dir)
+
+        self.assertEqual(gir.includes, [("GObject", "2.0")])
+        self.assertEqual(gir.shared_libraries, ["libfoo.so.1", "libbar.so.2"])
+        self.assertEqual(gir.private, set(["Foo.BarPrivate"]))
+
+        docs = gir.docs
+        entry = docs["all"]["Foo.Bar.frob"]
+        self.assertEqual(docs["all"]["Foo.Bar"].docs, "A bar.\nSince: 1.1")
+        self.assertEqual(entry.docs, "Frobs & stuff?")
+        self.assertEqual(entry.version, "1.2")
+        self.assertEqual(entry.deprecated, "Don't")
+        self.assertEqual(docs["parameters"]["Foo.Bar.frob.bar"].docs, "a bar")
+        self.assertEqual(docs["all"]["Foo.Bar.do_draw"].docs, "vfunc")
+        self.assertEqual(
+            docs["all_shadowed"]["Foo.Bar.frob_full"].docs, "Frobs more")
+
+        types, type_structs, shadow_map, instance_params, skipped = \
+            gir.raw_types
+        self.assertEqual(types["FooBar"], set(["Foo.Bar"]))
+        self.assertEqual(types["foo_bar_frob"], set(["Foo.Bar.frob"]))
+        self.assertEqual(instance_params["Foo.Bar.frob"], "bar")
+        self.assertEqual(shadow_map["foo_bar_frob_full"], "foo_bar_frob_all")
+        self.assertEqual(types["foo_bar_frob_all"], set(["Foo.Bar.frob_full"]))
+        self.assertFalse(types["foo_bar_frob_full"])
+        self.assertTrue("foo_bar_frob_full" in skipped)
+
+    def test_cache_entry(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "Foo-1.0.cache")
+            with open(path, "wb") as h:
+                h.write(_CacheEntry.dump({
+                    "types": Namespace.types.dump({"foo_bar": ["Foo.bar"]}),
+                    "private": Namespace.private.dump(
+                        set(["Foo.BarPrivate"])),
+                }))
+            ns = _load_cached_namespace(path, "Foo", "1.0")
+            self.assertTrue(isinstance(ns.types, SymbolTable))
+            self.assertEqual(dict(ns.types), {"foo_bar": ["Foo.bar"]})
+            self.assertFalse("private" in ns.__dict__)
+            self.assertEqual(ns.private, set(["Foo.BarPrivate"]))
+
+            # reading doesn't move the shared file position
+            entry = ns._cache_entry
+            pos = entry._file.tell()
+            self.assertEqual(
+                pickle.loads(entry.read("private")), set(["Foo.BarPrivate"]))
+            self.assertEqual(entry._file.tell(), pos)
+            entry._file.close()
+
+            with open(path, "wb") as h:
+                h.write(b"foo")
+            self.assertTrue(_load_cached_namespace(path, "Foo", "1.0") is None)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_cache_digest(self):
+        # computing the cache key must not import the namespace
+        def import_namespace(*args, **kwargs):
+            raise AssertionError
+
+        orig = util.import_namespace
+        util.import_namespace = import_namespace
+        try:
+            digest = _get_cache_digest("GLib", "2.0")
+        finally:
+            util.import_namespace = orig
+        self.assertEqual(len(digest), 64)
+        self.assertTrue(
+            util.get_typelib_path("GLib", "2.0").endswith("GLib-2.0.typelib"))
+        self.assertTrue(util.get_typelib_path("GLib", "0.1") is None)
+
+    def test_gir_cache(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            paths = []
+            for name in ["Foo", "Bar", "Baz"]:
+                path = os.path.join(temp_dir, name + "-1.0.gir")
+                with open(path, "w", encoding="utf-8") as h:
+                    h.write(GIR)
+                paths.append(path)
+            size = os.path.getsize(paths[0])
+
+            gir_cache = _GirCache(size * 2)
+            foo = gir_cache.get(paths[0])
+            self.assertTrue(gir_cache.get(paths[0]) is foo)
+            entry = foo.docs["all"]["Foo.Bar"]
+            self.assertEqual((entry.docs, entry.version), ("A bar.", "1.1"))
+            gir_cache.get(paths[1])
+            gir_cache.get(paths[0])
+            self.assertEqual((gir_cache.hits, gir_cache.misses), (2, 2))
+            self.assertEqual(gir_cache.size, size * 2)
+
+            # evicts the least recently used one
+            gir_cache.get(paths[2])
+            self.assertTrue(gir_cache.get(paths[0]) is foo)
+            self.assertEqual((gir_cache.hits, gir_cache.misses), (3, 3))
+            gir_cache.get(paths[1])
+            self.assertEqual(gir_cache.misses, 4)
+
+            # always keeps the last one
+            gir_cache.max_bytes = 0
+            gir_cache.evict()
+            self.assertEqual(gir_cache.size, size)
+            gir_cache.get(paths[1])
+            self.assertEqual(gir_cache.misses, 4)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_attribute_index(self):
+        module = types.ModuleType("Foo")
+
+        class Bar(object):
+            def frob(self):
+                pass
+
+        class Baz(Bar):
+            pass
+
+        module.Bar = Bar
+        module.Baz = Baz
+        module.func = lambda: None
+
+        index = _AttributeIndex(module)
+        self.assertTrue(index.is_available("Foo.func"))
+        self.assertFalse(index.is_available("Foo.nope"))
+        self.assertTrue(index.is_available("Foo.Bar.frob"))
+        self.assertFalse(index.is_available("Foo.Baz.frob"))
+        self.assertFalse(index.is_available("Foo.Nope.frob"))
+        self.assertTrue("Baz" in index.get_names())
+
+        # pgi: names come from the typelib, attributes get created on access
+        class Wrapper(object):
+            def iternames(self):
+                return iter(["print", "2d", "broken"])
+
+        class LazyModule(types.ModuleType):
+            def __getattr__(self, name):
+                if name in ("print_", "_2d"):
+                    return name
+                raise AttributeError(name)
+
+        module = LazyModule("Foo")
+        module._wrapper = Wrapper()
+        index = _AttributeIndex(module)
+        self.assertTrue(index.is_available("Foo.print_"))
+        self.assertTrue(index.is_available("Foo._2d"))
+        self.assertFalse(index.is_available("Foo.print"))
+        self.assertFalse(index.is_available("Foo.broken"))
+        self.assertFalse("print" in index.get_names())
+
+    def test_doc_entry(self):
+        entry = DocEntry("foo", "3." + "14", "", None)
+        self.assertEqual(tuple(entry), ("foo", "3.14", "", ""))
+        docs, version, deprecated_version, deprecated = entry
+        self.assertTrue(version is DocEntry("", "3.14", "", "").version)
+        self.assertEqual(pickle.loads(pickle.dumps(entry)), entry)
+        self.assertNotEqual(entry, DocEntry("foo", "3.16", "", ""))
+
     def test_fixup_added_since(self):
         self.assertEqual(
             fixup_since("Foo\nSince: 3.14"), ("Foo", "3.14"))
@@ -7,10 +7,12 @@
 
 
 import unittest
+from collections import OrderedDict
 
 from pgidocgen.repo import Repository
+from pgidocgen.parser import docstring_to_rest, docstring_to_rest_many
 from pgidocgen.docobj import Class, Function, Flags, get_hierarchy, PyClass, \
-    Constant
+    Constant, Deferred
 from pgidocgen.overrides import parse_override_docs
 
 
@@ -108,6 +110,93 @@ class TRepository(unittest.TestCase):
         field = find(struct.fields, "realloc")
         self.assertTrue("object" in field.type_desc)
 
+    def test_dependency_lookups(self):
+        repo = Repository("GObject", "2.0")
+
+        # from the dependency
+        self.assertEqual(repo.get_shadowed("g_idle_add"), "g_idle_add_full")
+        self.assertEqual(repo.lookup_py_id("g_idle_add"), "GLib.idle_add")
+        self.assertEqual(repo.lookup_py_id("g_idle_add"), "GLib.idle_add")
+        self.assertEqual(repo.lookup_py_id("g_idle_add", shadowed=False), None)
+        self.assertEqual(repo.lookup_py_id("g_idle_add", shadowed=False), None)
+
+        # from the namespace itself
+        self.assertEqual(
+            repo.lookup_py_id("g_object_get_data"), "GObject.Object.get_data")
+        self.assertEqual(repo.lookup_all_py_id("GObject"), ["GObject.Object"])
+        self.assertEqual(repo.lookup_all_py_id("nope_nope"), [])
+
+        # batched, shadowed and from the dependency included
+        ids = ["g_idle_add", "g_object_get_data", "GObject", "nope_nope"]
+        expected = {
+            "g_idle_add": "GLib.idle_add",
+            "g_object_get_data": "GObject.Object.get_data",
+            "GObject": "GObject.Object",
+            "nope_nope": None,
+        }
+        self.assertEqual(
+            Repository("GObject", "2.0").lookup_py_ids(ids), expected)
+        self.assertEqual(repo.lookup_py_ids(ids), expected)
+
+        self.assertEqual(
+            repo.lookup_docref("GObject"), ("type", "GObject.Object"))
+        self.assertEqual(
+            repo.lookup_docref("g-object-get-data"),
+            ("func", "GObject.Object.get_data"))
+        self.assertEqual(
+            repo.lookup_docref("GObject--some-prop"),
+            ("prop", "GObject.Object.props.some_prop"))
+        self.assertEqual(repo.lookup_docref("nope-nope"), None)
+        self.assertEqual(repo.lookup_docref("nope-nope"), None)
+
+    def test_lookup_docs_owner(self):
+        repo = Repository("GObject", "2.0")
+        glib = repo._namespace_by_name["GLib"]
+        glib.__dict__.pop("docs", None)
+
+        # a miss only looks at the namespace owning the name
+        self.assertEqual(
+            repo.lookup_docs("all", "GObject.BaseFinalizeFunc")[1], u"")
+        self.assertEqual(repo.lookup_meta("all", "Nope.nope"), (u"", u"", u""))
+        self.assertFalse("docs" in glib.__dict__)
+
+        self.assertTrue(repo.lookup_docs("all", "GLib.idle_add")[0])
+        self.assertTrue("docs" in glib.__dict__)
+
+    def test_docstring_to_rest_many(self):
+        repo = Repository("GLib", "2.0")
+        items = [
+            (u"a #GMainLoop", None, None),
+            (u"@context: a #GMainContext", "GLib.MainLoop",
+             "GLib.MainLoop.new"),
+            (u"returns %TRUE", None, "GLib.idle_add"),
+            (u"see <link linkend='nope'>nope</link>", None, None),
+        ]
+        expected = [(docstring_to_rest(repo, *item), 0) for item in items]
+        expected[-1] = (expected[-1][0], 1)
+        missed_links = repo.missed_links
+        self.assertEqual(docstring_to_rest_many(repo, items, 1), expected)
+        self.assertEqual(docstring_to_rest_many(repo, items[:1], 1),
+                         expected[:1])
+        self.assertEqual(docstring_to_rest_many(repo, items, 2), expected)
+        self.assertEqual(repo.missed_links, missed_links)
+
+    def test_defer(self):
+        repo = Repository("GLib", "2.0")
+        expected = repo.lookup_docs("all", "GLib.idle_add")
+        self.assertEqual(repo.defer(lambda: u"foo"), u"foo")
+
+        repo = Repository("GLib", "2.0")
+        repo._pending = OrderedDict()
+        repo._deferred = []
+        docs = repo.lookup_docs("all", "GLib.idle_add", deferred=True)
+        self.assertTrue(all(isinstance(d, Deferred) for d in docs))
+        self.assertEqual(len(repo._pending), 2)
+        self.assertEqual(repo._docstring_count, 0)
+        repo._resolve_deferred(2)
+        self.assertEqual(repo._docstring_count, 2)
+        self.assertEqual(tuple(d.get() for d in docs), expected)
+
     def test_gio(self):
         repo = Repository("Gio", "2.0")
         Gio = repo.import_module()
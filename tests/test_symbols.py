@@ -0,0 +1,48 @@
+# Copyright 2026 Christoph Reiter
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+
+import unittest
+
+from pgidocgen.symbols import SymbolTable, dump_symbol_table
+
+
+class TSymbolTable(unittest.TestCase):
+
+    def test_main(self):
+        mapping = {
+            "GtkWidget": ["Gtk.Widget"],
+            "gtk_list_store_new": [],
+            "g_object_ref": ["GObject.Object.ref", "GObject.ref"],
+            u"f\xf6\xf6": [u"B\xe4r"],
+        }
+        for i in range(1000):
+            mapping["sym_%d" % i] = ["Foo.sym_%d" % i]
+
+        table = SymbolTable(dump_symbol_table(mapping))
+        self.assertEqual(len(table), len(mapping))
+        self.assertEqual(list(table), sorted(mapping))
+        self.assertEqual(dict(table), mapping)
+        self.assertEqual(table["gtk_list_store_new"], [])
+        self.assertEqual(
+            table["g_object_ref"], ["GObject.Object.ref", "GObject.ref"])
+        self.assertTrue(u"f\xf6\xf6" in table)
+        self.assertFalse("GtkWidge" in table)
+        self.assertFalse(None in table)
+        self.assertRaises(KeyError, table.__getitem__, "nope")
+        self.assertEqual(table.get("nope"), None)
+
+    def test_empty(self):
+        table = SymbolTable(dump_symbol_table({}))
+        self.assertEqual(len(table), 0)
+        self.assertFalse("foo" in table)
+        self.assertEqual(list(table), [])
+
+    def test_invalid(self):
+        data = dump_symbol_table({"foo": ["bar"]})
+        self.assertRaises(ValueError, SymbolTable, b"foo" + data)
+        self.assertRaises(ValueError, SymbolTable, data[:-2])
+        self.assertRaises(ValueError, SymbolTable, data[:30])
@@ -16,7 +16,60 @@ from pgidocgen.util import is_staticmethod, \
     is_method_owner, is_fundamental, is_object, instance_to_rest, \
     get_child_properties, fake_subclasses, get_style_properties, \
     unescape_parameter, fake_bases, is_attribute_owner, unindent, \
-    get_csv_line, get_signature_string, sanitize_instance_repr
+    get_csv_line, get_signature_string, sanitize_instance_repr, \
+    ClassHierarchy, iter_public_attr, iter_owned_public_attr, \
+    get_overridden_class
+
+
+def _sort_key(cls):
+    return (cls.__module__, cls.__name__)
+
+
+# The straightforward versions of fake_subclasses(), fake_bases() and
+# fake_mro() which ClassHierarchy replaced, to compare against.
+
+def _ref_subclasses(cls):
+    subs = []
+    for sub in cls.__subclasses__():
+        for subsub in _ref_subclasses(sub):
+            if get_overridden_class(subsub) is sub:
+                subs.append(subsub)
+                break
+        else:
+            subs.append(sub)
+    return subs
+
+
+def _ref_bases(obj, ignore_redundant=False):
+    possible_bases = []
+    known = set()
+    for base in obj.__bases__:
+        new_bases = []
+        if base.__name__ == obj.__name__ and \
+                base.__module__ == obj.__module__:
+            new_bases.extend(_ref_bases(base, ignore_redundant))
+        else:
+            new_bases.append(base)
+
+        for new_base in new_bases:
+            if not ignore_redundant or new_base not in known:
+                possible_bases.append(new_base)
+
+        known.update(base.__mro__)
+
+    return [base for base in obj.__mro__ if base in possible_bases]
+
+
+def _ref_mro(obj):
+
+    def get_mro(obj):
+        mro = [obj]
+        for base in _ref_bases(obj):
+            mro.extend(get_mro(base))
+        return mro
+
+    possible_mro = get_mro(obj)
+    return [base for base in obj.__mro__ if base in possible_mro]
 
 
 class TUtil(unittest.TestCase):
@@ -66,6 +119,16 @@ class TUtil(unittest.TestCase):
         self.assertTrue(is_method_owner(Gtk.AccelGroup, "connect"))
         self.assertFalse(is_method_owner(Gtk.AboutDialog, "get_focus_on_map"))
 
+    def test_iter_owned_public_attr(self):
+        from pgi.repository import Gtk, GObject
+
+        for cls in [Gtk.Viewport, Gtk.ActionGroup, Gtk.TreeIter,
+                    GObject.Object]:
+            expected = [a for a, v in iter_public_attr(cls)
+                        if is_attribute_owner(cls, a)]
+            self.assertEqual(
+                [a for a, v in iter_owned_public_attr(cls)], expected)
+
     def test_is_attribute_owner(self):
         from pgi.repository import GdkPixbuf
 
@@ -134,6 +197,38 @@ class TUtil(unittest.TestCase):
         self.assertEqual(len(get_style_properties(Gtk.Widget)), 17)
         self.assertEqual(len(get_style_properties(Gtk.TreeView)), 11)
 
+    def test_class_hierarchy_properties(self):
+        from pgi.repository import Gtk
+
+        def names(props):
+            return sorted(p.name for p in props)
+
+        hierarchy = ClassHierarchy()
+        self.assertEqual(hierarchy.get_stats(), u"")
+        self.assertEqual(
+            names(hierarchy.get_child_properties(Gtk.Paned)),
+            ["resize", "shrink"])
+        self.assertEqual(
+            names(hierarchy.get_child_properties(Gtk.Box)),
+            ["expand", "fill", "pack-type", "padding", "position"])
+        self.assertEqual(
+            names(hierarchy.get_child_properties(Gtk.ActionBar)),
+            ["pack-type", "position"])
+        self.assertEqual(names(hierarchy.get_child_properties(Gtk.Bin)), [])
+        # Paned, Container, Box, ActionBar, Bin
+        self.assertEqual(
+            hierarchy.get_stats(), "5 class struct queries, 4 saved")
+
+        self.assertEqual(
+            names(hierarchy.get_style_properties(Gtk.Paned)),
+            ["handle-size"])
+        self.assertEqual(len(hierarchy.get_style_properties(Gtk.Widget)), 17)
+        self.assertEqual(
+            len(hierarchy.get_style_properties(Gtk.TreeView)), 11)
+        # Paned, Container, Widget, TreeView
+        self.assertEqual(
+            hierarchy.get_stats(), "9 class struct queries, 7 saved")
+
     def test_fake_subclasses(self):
         from pgi.repository import Gtk
 
@@ -157,6 +252,34 @@ class TUtil(unittest.TestCase):
         self.assertEqual(
             fake_bases(Gtk.Dialog, ignore_redundant=True), [Gtk.Window])
 
+    def test_class_hierarchy(self):
+        from pgi.repository import Gtk
+
+        hierarchy = ClassHierarchy()
+        for cls in [Gtk.Dialog, Gtk.TreeView, Gtk.Scrollable, Gtk.Widget]:
+            for i in range(2):
+                self.assertEqual(hierarchy.get_bases(cls), _ref_bases(cls))
+                self.assertEqual(
+                    hierarchy.get_bases(cls, ignore_redundant=True),
+                    _ref_bases(cls, ignore_redundant=True))
+                self.assertEqual(hierarchy.get_mro(cls), _ref_mro(cls))
+                # the order of subclasses isn't defined
+                self.assertEqual(
+                    sorted(hierarchy.get_subclasses(cls), key=_sort_key),
+                    sorted(_ref_subclasses(cls), key=_sort_key))
+
+        self.assertEqual(
+            hierarchy.get_bases(Gtk.Dialog, ignore_redundant=True),
+            [Gtk.Window])
+        self.assertEqual(
+            hierarchy.get_mro(Gtk.Dialog)[:5],
+            [Gtk.Dialog, Gtk.Window, Gtk.Bin, Gtk.Container, Gtk.Widget])
+        self.assertIn(Gtk.TreeView, hierarchy.get_subclasses(Gtk.Scrollable))
+
+        # results can be modified by the caller
+        hierarchy.get_mro(Gtk.Dialog).pop()
+        self.assertEqual(hierarchy.get_mro(Gtk.Dialog), _ref_mro(Gtk.Dialog))
+
     def test_sanitize_instance_repr(self):
         san = sanitize_instance_repr
         assert san("") == ""
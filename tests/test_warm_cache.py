@@ -0,0 +1,95 @@
+# Copyright 2026 Christoph Reiter
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+from pgidocgen import warm_cache, namespace
+from pgidocgen.girheader import DependencyGraph
+
+
+GIR = """\
+<?xml version="1.0"?>
+<repository version="1.2" xmlns="http://www.gtk.org/introspection/core/1.0">
+  %s
+  <namespace name="%s" version="1.0"/>
+</repository>
+"""
+
+
+class TWarmCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self._cache_dir = namespace.CACHE_DIR
+
+    def tearDown(self):
+        namespace.CACHE_DIR = self._cache_dir
+        shutil.rmtree(self.dir)
+
+    def test_get_plan(self):
+        girs = {}
+        for name, includes in [
+                ("Foo", ""),
+                ("Bar", '<include name="Foo" version="1.0"/>'
+                        '<include name="GLib" version="2.0"/>'),
+                ("GLib", "")]:
+            key = name + "-1.0"
+            girs[key] = path = os.path.join(self.dir, key + ".gir")
+            with open(path, "w", encoding="utf-8") as h:
+                h.write(GIR % (includes, name))
+        graph = DependencyGraph(girs)
+
+        pending, results = warm_cache._get_plan(graph, ["Bar-1.0"])
+        self.assertEqual(pending, {
+            "Foo-1.0": set(["GObject-2.0"]),
+            "Bar-1.0": set(["Foo-1.0", "GLib-2.0"]),
+        })
+        self.assertEqual(sorted(results), ["GLib-2.0", "GObject-2.0"])
+        self.assertEqual(results["GLib-2.0"][1], "skipped")
+
+        pending, results = warm_cache._get_plan(graph, ["GLib-1.0"])
+        self.assertEqual(pending, {"GLib-1.0": set()})
+        self.assertEqual(results, {})
+
+    def test_main_single_import_error(self):
+        def get_cache_entry_path(namespace, version):
+            return os.path.join(self.dir, "%s-%s.cache" % (namespace, version))
+
+        def get_namespace(namespace, version):
+            raise ImportError(namespace)
+
+        orig = (warm_cache.get_cache_entry_path, warm_cache.get_namespace)
+        warm_cache.get_cache_entry_path = get_cache_entry_path
+        warm_cache.get_namespace = get_namespace
+        out = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(out):
+                with self.assertRaises(SystemExit) as context:
+                    warm_cache._main_single(self.dir, "Foo-1.0")
+        finally:
+            warm_cache.get_cache_entry_path, warm_cache.get_namespace = orig
+
+        self.assertEqual(context.exception.code, 1)
+        self.assertEqual(out.getvalue(), "Import failed: Foo\n")
+
+    def test_format_result(self):
+        self.assertEqual(
+            warm_cache._format_result(
+                "Foo-1.0", "parsed", {"time": 1.5, "size": 1024 ** 2}),
+            "Foo-1.0: parsed in 1.50s, 1.0 MB")
+        self.assertEqual(
+            warm_cache._format_result("Foo-1.0", "failed", {"time": 2}),
+            "Foo-1.0: failed after 2.00s")
+        self.assertEqual(
+            warm_cache._format_result(
+                "Foo-1.0", "skipped", {"reason": "depends on Bar-1.0"}),
+            "Foo-1.0: skipped (depends on Bar-1.0)")